@@ -7,7 +7,7 @@ from lambda_datasci_perf.lambda_datasci_perf_stack import LambdaDatasciPerfStack
 
 
 app = cdk.App()
-LambdaDatasciPerfStack(app, "LambdaDatasciPerfStack",
+LambdaDatasciPerfStack(app, app.node.try_get_context("stackName") or "LambdaDatasciPerfStack",
     env=cdk.Environment(account=os.getenv('CDK_DEFAULT_ACCOUNT'), region=os.getenv('CDK_DEFAULT_REGION')),
 )
 
@@ -0,0 +1,236 @@
+"""
+Vectorized cold start analytics over REPORT records (see ingest.py for the schema).
+
+Every function computes its statistics for all method x runtime x architecture x memory combinations at once, with a single
+groupby rather than one filter per packaging method.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lambda_datasci_perf.matrix import DEFAULT_ARCHITECTURE, FUNCTION_NAME_PATTERN
+
+MATRIX_KEYS = ["method", "runtime", "architecture", "memory"]
+DEFAULT_PERCENTILES = (50, 95, 99)
+DEFAULT_BURST_GAP = pd.Timedelta(minutes=1)
+
+
+def add_matrix_columns(reports: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add method, runtime, architecture and memory columns parsed from function_name. Names without an
+    architecture are x86_64 functions, and names that are not perf_ functions get missing values.
+
+    The pattern is only matched once per distinct function name, and the results are categorical.
+    """
+    names = reports["function_name"].astype("category")
+    matrix = names.cat.categories.to_series().str.extract(FUNCTION_NAME_PATTERN)
+    matrix.loc[matrix["method"].notna(), "architecture"] = matrix["architecture"].fillna(DEFAULT_ARCHITECTURE)
+    matrix["memory"] = pd.to_numeric(matrix["memory"])
+    reports = reports.copy()
+    for key in MATRIX_KEYS:
+        categories = matrix[key].astype("category")
+        reports[key] = pd.Categorical.from_codes(categories.cat.codes.values[names.cat.codes.values],
+                                                 categories.cat.categories)
+    return reports
+
+
+def _with_matrix(reports: pd.DataFrame, by) -> pd.DataFrame:
+    if any(key in MATRIX_KEYS and key not in reports for key in by):
+        return add_matrix_columns(reports)
+    return reports
+
+
+def segment_bursts(timestamps: pd.Series, gap: pd.Timedelta = DEFAULT_BURST_GAP) -> pd.Series:
+    """
+    Number each record by the burst of invocations it belongs to. A new burst starts after a gap longer than `gap`.
+    """
+    ordered = timestamps.sort_values()
+    bursts = (ordered.diff() > gap).cumsum()
+    return bursts.reindex(timestamps.index).rename("burst")
+
+
+def burst_ranges(reports: pd.DataFrame, gap: pd.Timedelta = DEFAULT_BURST_GAP) -> pd.DataFrame:
+    """
+    Start, end and invocation count of each burst
+    """
+    bursts = segment_bursts(reports["timestamp"], gap)
+    return reports.groupby(bursts)["timestamp"].agg(start="min", end="max", invocations="size")
+
+
+def grouped_quantiles(codes: np.ndarray, values: np.ndarray, quantiles) -> np.ndarray:
+    """
+    Linearly interpolated quantiles of values for every group code 0..n-1, from a single sort.
+
+    Much faster than groupby().quantile() when there are many small groups, e.g. one per second per function.
+    Returns an array of shape (n_groups, len(quantiles)).
+    """
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(codes) != 0])
+    counts = np.diff(np.r_[starts, len(codes)])
+    positions = starts[:, None] + np.asarray(quantiles)[None, :] * (counts - 1)[:, None]
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, (starts + counts - 1)[:, None])
+    return values[lower] + (positions - lower) * (values[upper] - values[lower])
+
+
+def windowed_stats(reports: pd.DataFrame, value: str = "init_duration_ms", freq: str = "1s",
+                   percentiles=DEFAULT_PERCENTILES, by=MATRIX_KEYS) -> pd.DataFrame:
+    """
+    Count and percentiles of `value` per combination of `by` and time window of `freq`, in one grouped pass.
+
+    Only windows containing at least one record appear in the result. Records missing any `by` key, e.g. from
+    functions outside the matrix, are left out.
+    """
+    reports = _with_matrix(reports[reports[value].notna()], by)
+    # groupby drops missing keys and ngroup() numbers them -1, which would misalign the quantiles
+    reports = reports.dropna(subset=list(by))
+    window = reports["timestamp"].dt.floor(freq).rename("window")
+    grouped = reports.groupby([reports[key] for key in by] + [window], observed=True)
+    counts = grouped.size()
+    quantiles = grouped_quantiles(grouped.ngroup().values, reports[value].values.astype(float),
+                                  [p / 100 for p in percentiles])
+    stats = pd.DataFrame(quantiles, index=counts.index, columns=[f"p{p}" for p in percentiles])
+    stats.insert(0, "count", counts)
+    return stats
+
+
+class QuantileSketch:
+    """
+    A merging t-digest: a bounded set of weighted centroids that estimates quantiles of a stream, with the best
+    accuracy in the tails.
+
+    Values are buffered and compressed in vectorized batches, and sketches of separate chunks can be merged.
+    """
+
+    def __init__(self, compression: float = 200, buffer_size: int = 50_000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def count(self) -> float:
+        return self.weights.sum() + self._buffered
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other: "QuantileSketch"):
+        other._compress()
+        self._compress(other.means, other.weights)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _compress(self, extra_means=None, extra_weights=None):
+        means = [self.means] + self._buffer
+        weights = [self.weights] + [np.ones(len(values)) for values in self._buffer]
+        if extra_means is not None:
+            means.append(extra_means)
+            weights.append(extra_weights)
+        means, weights = np.concatenate(means), np.concatenate(weights)
+        self._buffer, self._buffered = [], 0
+        if not len(means):
+            return
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        # The k1 scale function: clusters are small near q=0 and q=1, large around the median
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, np.diff(k) != 0])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        self._compress()
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan)
+        cumulative = np.cumsum(self.weights)
+        positions = np.r_[0, cumulative - self.weights / 2, cumulative[-1]]
+        values = np.r_[self.min, self.means, self.max]
+        return np.interp(np.asarray(q) * cumulative[-1], positions, values)
+
+
+def sketch_quantiles(frames, value: str = "init_duration_ms", percentiles=DEFAULT_PERCENTILES,
+                     by=MATRIX_KEYS, compression: float = 200) -> pd.DataFrame:
+    """
+    Approximate percentiles per combination of `by` over an iterable of DataFrames, e.g.
+    ParquetStore.iter_batches(), without holding the whole capture in memory
+    """
+    sketches = {}
+    for frame in frames:
+        frame = _with_matrix(frame, by)
+        for key, values in frame.groupby(list(by), observed=True)[value]:
+            sketches.setdefault(key, QuantileSketch(compression)).update(values.values)
+    quantiles = np.array(percentiles) / 100
+    stats = pd.DataFrame(
+        [[sketch.count, *sketch.quantile(quantiles)] for sketch in sketches.values()],
+        index=pd.MultiIndex.from_tuples(list(sketches), names=list(by)),
+        columns=["count"] + [f"p{p}" for p in percentiles],
+    )
+    return stats.sort_index()
+
+
+def bootstrap_quantiles(values, q: float = 0.5, n_resamples: int = 2000, seed=None) -> np.ndarray:
+    """
+    Bootstrap distribution of the q-quantile (inverted CDF definition) of values.
+
+    The quantile of a bootstrap resample is its k-th order statistic, which is distributed as the empirical
+    inverse CDF of a Beta(k, n + 1 - k) variable. Drawing that directly gives the exact bootstrap distribution
+    without materialising n_resamples x n resampled values.
+    """
+    values = np.sort(np.asarray(values, dtype=float))
+    values = values[~np.isnan(values)]
+    n = len(values)
+    k = min(max(int(np.ceil(q * n)), 1), n)
+    rng = np.random.default_rng(seed)
+    order_statistics = rng.beta(k, n + 1 - k, n_resamples)
+    return values[np.clip(np.ceil(order_statistics * n).astype(np.int64), 1, n) - 1]
+
+
+def bootstrap_difference(a, b, q: float = 0.5, n_resamples: int = 2000, confidence: float = 0.95,
+                         seed: int = None) -> dict:
+    """
+    Bootstrap confidence interval for quantile(a, q) - quantile(b, q)
+    """
+    rng = np.random.default_rng(seed)
+    differences = bootstrap_quantiles(a, q, n_resamples, rng) - bootstrap_quantiles(b, q, n_resamples, rng)
+    low, high = np.quantile(differences, [(1 - confidence) / 2, (1 + confidence) / 2])
+    difference = np.nanquantile(a, q, method="inverted_cdf") - np.nanquantile(b, q, method="inverted_cdf")
+    return {"difference": difference, "low": low, "high": high, "significant": bool(low > 0 or high < 0)}
+
+
+def compare_methods(reports: pd.DataFrame, baseline: str = "zip", value: str = "init_duration_ms",
+                    q: float = 0.5, n_resamples: int = 2000, confidence: float = 0.95, seed: int = None,
+                    min_samples: int = 20) -> pd.DataFrame:
+    """
+    For each runtime, architecture and memory, the bootstrap confidence interval of each method's quantile minus the baseline
+    method's. Combinations with fewer than `min_samples` values on either side are skipped.
+    """
+    reports = _with_matrix(reports[reports[value].notna()], MATRIX_KEYS)
+    samples = {key: values.values for key, values in reports.groupby(MATRIX_KEYS, observed=True)[value]}
+    rows = []
+    for (method, runtime, architecture, memory), values in samples.items():
+        baseline_values = samples.get((baseline, runtime, architecture, memory))
+        if method == baseline or baseline_values is None or min(len(values), len(baseline_values)) < min_samples:
+            continue
+        result = bootstrap_difference(values, baseline_values, q, n_resamples, confidence, seed)
+        rows.append({"method": method, "runtime": runtime, "architecture": architecture, "memory": memory,
+                     "samples": len(values), "baseline_samples": len(baseline_values), **result})
+    return pd.DataFrame(rows, columns=["method", "runtime", "architecture", "memory", "samples", "baseline_samples",
+                                       "difference", "low", "high", "significant"])
@@ -0,0 +1,293 @@
+"""
+Incremental ingestion of Lambda REPORT records from CloudWatch Logs Insights into a local Parquet store.
+
+Logs Insights returns at most 10,000 rows per query, so the time range is split into aligned windows, and any
+window that hits the cap is bisected until it does not. Windows are queried concurrently under a rate limit,
+and each completed window is recorded in the store for each log group and query, so later runs only query new
+windows, or new log groups and queries for old windows.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+MAX_RESULTS = 10_000
+
+REPORT_QUERY = f"""
+filter @type = "REPORT"
+| parse @log '/aws/lambda/*' as function_name
+| fields @timestamp, @requestId, function_name, @duration, @billedDuration, @memorySize, @maxMemoryUsed, @initDuration
+| sort @timestamp asc
+| limit {MAX_RESULTS}
+"""
+
+# Logs Insights field -> store column. @memorySize and @maxMemoryUsed are reported in bytes.
+REPORT_FIELDS = {
+    "@timestamp": "timestamp",
+    "@requestId": "request_id",
+    "function_name": "function_name",
+    "@duration": "duration_ms",
+    "@billedDuration": "billed_duration_ms",
+    "@memorySize": "memory_size_mb",
+    "@maxMemoryUsed": "max_memory_used_mb",
+    "@initDuration": "init_duration_ms",
+}
+BYTES_FIELDS = ("memory_size_mb", "max_memory_used_mb")
+TERMINAL_STATUSES = ("Complete", "Failed", "Cancelled", "Timeout")
+THROTTLING_ERROR_CODES = ("LimitExceededException", "ThrottlingException", "TooManyRequestsException")
+
+WINDOWS_MANIFEST = "_windows.json"
+
+
+class RateLimiter:
+    """
+    Spaces calls evenly across threads, e.g. to stay under the StartQuery transactions-per-second quota
+    """
+
+    def __init__(self, calls_per_second: float):
+        self.interval = 1 / calls_per_second
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def run_query(logs_client, log_group_names, start: int, end: int, query: str, rate_limiter: RateLimiter,
+              max_poll_interval: float = 5.0, max_attempts: int = 8):
+    """
+    Run one Logs Insights query over [start, end] (epoch seconds, inclusive) and return its result rows
+    """
+    for attempt in range(max_attempts):
+        rate_limiter.wait()
+        try:
+            query_id = logs_client.start_query(
+                logGroupNames=log_group_names, startTime=start, endTime=end, queryString=query
+            )["queryId"]
+            break
+        except Exception as error:
+            if _error_code(error) not in THROTTLING_ERROR_CODES or attempt == max_attempts - 1:
+                raise
+            time.sleep(min(2 ** attempt, 30))
+
+    poll_interval = 0.25
+    while True:
+        response = logs_client.get_query_results(queryId=query_id)
+        if response["status"] in TERMINAL_STATUSES:
+            break
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, max_poll_interval)
+    if response["status"] != "Complete":
+        raise RuntimeError(f"Query {query_id} for {start}-{end} finished with status {response['status']}")
+    return response["results"]
+
+
+def parse_results(results) -> pd.DataFrame:
+    """
+    Convert Logs Insights result rows ([{"field": ..., "value": ...}, ...]) into typed columns
+    """
+    records = pd.DataFrame.from_records([{cell["field"]: cell["value"] for cell in row} for row in results])
+    records = records.reindex(columns=list(REPORT_FIELDS)).rename(columns=REPORT_FIELDS)
+    records["timestamp"] = pd.to_datetime(records["timestamp"], utc=True)
+    numeric = ["duration_ms", "billed_duration_ms", "memory_size_mb", "max_memory_used_mb", "init_duration_ms"]
+    records[numeric] = records[numeric].apply(pd.to_numeric, errors="coerce")
+    records[list(BYTES_FIELDS)] = records[list(BYTES_FIELDS)] / 1_000_000
+    return records
+
+
+def query_window(logs_client, log_group_names, start: int, end: int, query: str, rate_limiter: RateLimiter):
+    """
+    Query [start, end), bisecting the window whenever it hits the result cap
+    """
+    results = run_query(logs_client, log_group_names, start, end - 1, query, rate_limiter)
+    if len(results) < MAX_RESULTS or end - start <= 1:
+        return [results]
+    middle = (start + end) // 2
+    return (query_window(logs_client, log_group_names, start, middle, query, rate_limiter)
+            + query_window(logs_client, log_group_names, middle, end, query, rate_limiter))
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha1(query.encode()).hexdigest()[:16]
+
+
+class ParquetStore:
+    """
+    Parquet files partitioned by function_name and date, plus a manifest of the windows already ingested, as
+    (log group, query hash, start, end) entries
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._manifest_path = os.path.join(root, WINDOWS_MANIFEST)
+
+    def completed_windows(self) -> set:
+        if not os.path.exists(self._manifest_path):
+            return set()
+        with open(self._manifest_path) as f:
+            # Entries without a log group and query, from older stores, are ignored and so queried again
+            return {tuple(entry) for entry in json.load(f) if len(entry) == 4}
+
+    def append(self, records: pd.DataFrame, window, log_group_names, query: str):
+        start, end = window
+        query_key = query_hash(query)
+        if not records.empty:
+            records = records.drop_duplicates("request_id")
+            dates = records["timestamp"].dt.strftime("%Y-%m-%d")
+            for (function_name, date), partition in records.groupby([records["function_name"], dates]):
+                directory = os.path.join(self.root, f"function_name={function_name}", f"date={date}")
+                os.makedirs(directory, exist_ok=True)
+                partition.drop(columns=["function_name"]).to_parquet(
+                    os.path.join(directory, f"part-{start}-{end}.parquet"), index=False
+                )
+        windows = sorted(self.completed_windows()
+                         | {(log_group_name, query_key, start, end) for log_group_name in log_group_names})
+        temporary_path = f"{self._manifest_path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(windows, f)
+        os.replace(temporary_path, self._manifest_path)
+
+    def load(self, function_names=None, start=None, end=None) -> pd.DataFrame:
+        filters = []
+        if function_names:
+            filters.append(("function_name", "in", list(function_names)))
+        if start is not None:
+            filters.append(("timestamp", ">=", pd.Timestamp(_utc(start))))
+        if end is not None:
+            filters.append(("timestamp", "<", pd.Timestamp(_utc(end))))
+        records = pd.read_parquet(self.root, filters=filters or None)
+        records["function_name"] = records["function_name"].astype(str)
+        return records.drop(columns=["date"]).sort_values("timestamp").drop_duplicates("request_id")
+
+    def iter_batches(self, columns=None, batch_size: int = 1_000_000):
+        """
+        Yield the store as DataFrames of at most batch_size rows, for analyses that do not fit in memory
+        """
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.root, format="parquet", partitioning="hive")
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+            frame = batch.to_pandas()
+            if "function_name" in frame:
+                frame["function_name"] = frame["function_name"].astype(str)
+            yield frame
+
+
+def _utc(moment: datetime.datetime) -> datetime.datetime:
+    # Naive datetimes are taken as local time, as datetime.timestamp() does
+    return moment.astimezone(datetime.timezone.utc)
+
+
+def windows_between(start: datetime.datetime, end: datetime.datetime, window: datetime.timedelta):
+    """
+    Window boundaries aligned to multiples of the window size, so repeated runs produce the same windows
+    """
+    size = int(window.total_seconds())
+    first = int(start.timestamp()) // size * size
+    last = int(end.timestamp())
+    return [(window_start, window_start + size) for window_start in range(first, last - size + 1, size)]
+
+
+def ingest(logs_client, log_group_names, start: datetime.datetime, end: datetime.datetime, store: ParquetStore,
+           window: datetime.timedelta = datetime.timedelta(minutes=15), max_concurrency: int = 4,
+           start_query_rate: float = 4.0, settle: datetime.timedelta = datetime.timedelta(minutes=5),
+           query: str = REPORT_QUERY) -> dict:
+    """
+    Query every complete window in [start, end) that is not already in the store, and append the results.
+
+    A window is only skipped once the store has it for every log group with this query. Otherwise it is
+    queried for the log groups that are missing, e.g. for functions added since the last run. Windows ending
+    within `settle` of now are skipped, because log events can arrive late.
+    """
+    end = min(_utc(end), datetime.datetime.now(datetime.timezone.utc) - settle)
+    completed = store.completed_windows()
+    query_key = query_hash(query)
+    pending = {}
+    skipped = 0
+    for window_start, window_end in windows_between(start, end, window):
+        missing = [name for name in log_group_names if (name, query_key, window_start, window_end) not in completed]
+        if missing:
+            pending[(window_start, window_end)] = missing
+        else:
+            skipped += 1
+    rate_limiter = RateLimiter(start_query_rate)
+
+    rows = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(query_window, logs_client, missing, window_start, window_end, query, rate_limiter):
+                (window_start, window_end)
+            for (window_start, window_end), missing in pending.items()
+        }
+        for future in as_completed(futures):
+            results = [row for chunk in future.result() for row in chunk]
+            records = parse_results(results) if results else pd.DataFrame(columns=list(REPORT_FIELDS.values()))
+            store.append(records, futures[future], pending[futures[future]], query)
+            rows += len(records)
+    return {"windows_queried": len(pending), "windows_skipped": skipped, "rows": rows}
+
+
+def _recording_key(log_group_names, start_time, end_time, query_string):
+    key = json.dumps([sorted(log_group_names), start_time, end_time, query_string])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class RecordingLogsClient:
+    """
+    Wraps a real CloudWatch Logs client and saves each completed query's results for offline replay
+    """
+
+    def __init__(self, logs_client, directory: str):
+        self.logs_client = logs_client
+        self.directory = directory
+        self._keys = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def start_query(self, logGroupNames, startTime, endTime, queryString, **kwargs):
+        response = self.logs_client.start_query(
+            logGroupNames=logGroupNames, startTime=startTime, endTime=endTime, queryString=queryString, **kwargs
+        )
+        self._keys[response["queryId"]] = _recording_key(logGroupNames, startTime, endTime, queryString)
+        return response
+
+    def get_query_results(self, queryId):
+        response = self.logs_client.get_query_results(queryId=queryId)
+        if response["status"] == "Complete":
+            with open(os.path.join(self.directory, f"{self._keys[queryId]}.json"), "w") as f:
+                json.dump(response["results"], f)
+        return response
+
+
+class RecordedLogsClient:
+    """
+    Replays results saved by RecordingLogsClient. Queries that were never recorded return no rows.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def start_query(self, logGroupNames, startTime, endTime, queryString, **_kwargs):
+        return {"queryId": _recording_key(logGroupNames, startTime, endTime, queryString)}
+
+    def get_query_results(self, queryId):
+        path = os.path.join(self.directory, f"{queryId}.json")
+        if not os.path.exists(path):
+            return {"status": "Complete", "results": []}
+        with open(path) as f:
+            return {"status": "Complete", "results": json.load(f)}
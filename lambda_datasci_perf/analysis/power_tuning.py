@@ -0,0 +1,149 @@
+"""
+Cost and latency analysis of the perf_{method}_{runtime}[_{architecture}]_{memory} function matrix from Lambda REPORT
+data.
+"""
+
+import gzip
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+from lambda_datasci_perf.matrix import DEFAULT_ARCHITECTURE, FUNCTION_NAME_PATTERN
+
+# us-east-1 on-demand prices. Pass different values to analyse() for other regions.
+PRICE_PER_GB_SECOND = {"x86_64": 0.0000166667, "arm64": 0.0000133334}
+PRICE_PER_MILLION_REQUESTS = 0.20
+
+FUNCTION_NAME_IN_PATH_PATTERN = re.compile(r"(perf_[A-Za-z0-9_]+_Python\d+(?:_arm64|_x86_64)?_\d+)")
+
+REPORT_PATTERN = (
+    r"Duration: (?P<duration_ms>[\d.]+) ms\s+"
+    r"Billed Duration: (?P<billed_duration_ms>[\d.]+) ms\s+"
+    r"Memory Size: (?P<memory_size_mb>\d+) MB\s+"
+    r"Max Memory Used: (?P<max_memory_used_mb>\d+) MB"
+    r"(?:\s+Init Duration: (?P<init_duration_ms>[\d.]+) ms)?"
+)
+
+REPORT_COLUMNS = ["duration_ms", "billed_duration_ms", "memory_size_mb", "max_memory_used_mb", "init_duration_ms"]
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def parse_report_messages(function_names: pd.Series, messages: pd.Series) -> pd.DataFrame:
+    """
+    Parse raw REPORT log lines into numeric columns in one vectorized pass
+    """
+    parsed = messages.str.extract(REPORT_PATTERN)
+    parsed = parsed[parsed["duration_ms"].notna()].astype(float)
+    parsed.insert(0, "function_name", function_names[parsed.index].values)
+    return parsed.reset_index(drop=True)
+
+
+def _open_text(path):
+    return gzip.open(path, "rt") if path.endswith(".gz") else open(path)
+
+
+def load_reports(paths, function_name: str = None) -> pd.DataFrame:
+    """
+    Load REPORT data from any mix of:
+     - JSONL captures, with either the numeric fields (see REPORT_COLUMNS) or a raw REPORT "message", and a
+       "function_name" on each record
+     - CloudWatch Logs export files (plain text or .gz), with the function name taken from function_name or the path
+    """
+    frames = []
+    for path in paths:
+        if path.endswith((".jsonl", ".jsonl.gz")):
+            with _open_text(path) as f:
+                records = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+            if "message" in records:
+                frames.append(parse_report_messages(records["function_name"], records["message"]))
+            else:
+                frames.append(records[["function_name"] + [c for c in REPORT_COLUMNS if c in records]])
+        else:
+            name = function_name
+            if name is None:
+                match = FUNCTION_NAME_IN_PATH_PATTERN.search(path)
+                if match is None:
+                    raise ValueError(f"Cannot determine the function name for {path}, pass function_name")
+                name = match.group(1)
+            with _open_text(path) as f:
+                messages = pd.Series([line for line in f if "REPORT" in line], dtype=object)
+            frames.append(parse_report_messages(pd.Series(name, index=messages.index), messages))
+    reports = pd.concat(frames, ignore_index=True)
+    if "init_duration_ms" not in reports:
+        reports["init_duration_ms"] = np.nan
+    return reports
+
+
+def analyse(reports: pd.DataFrame, architecture: str = None, price_per_gb_second: float = None,
+            price_per_million_requests: float = PRICE_PER_MILLION_REQUESTS) -> pd.DataFrame:
+    """
+    Per-function cost and latency summary.
+
+    Latency is the client-visible duration, i.e. Duration plus Init Duration for cold starts. The expected
+    latency weights warm and cold latency by the observed cold start rate. Cost uses Billed Duration as
+    reported, so it follows whatever Lambda billed for the init phase at the time. Each function is priced for
+    the architecture in its name unless `architecture` or `price_per_gb_second` is given.
+    """
+    reports = reports.copy()
+    reports["cold"] = reports["init_duration_ms"].notna()
+    reports["latency_ms"] = reports["duration_ms"] + reports["init_duration_ms"].fillna(0)
+    reports["gb_seconds"] = reports["billed_duration_ms"] / 1000 * reports["memory_size_mb"] / 1024
+
+    grouped = reports.groupby("function_name")
+    summary = pd.DataFrame({
+        "invocations": grouped.size(),
+        "memory_size_mb": grouped["memory_size_mb"].max(),
+        "max_memory_used_mb": grouped["max_memory_used_mb"].max(),
+        "cold_start_rate": grouped["cold"].mean(),
+        "warm_mean_ms": reports[~reports["cold"]].groupby("function_name")["latency_ms"].mean(),
+        "cold_mean_ms": reports[reports["cold"]].groupby("function_name")["latency_ms"].mean(),
+        "gb_seconds_per_invocation": grouped["gb_seconds"].mean(),
+    })
+    percentiles = grouped["latency_ms"].quantile([p / 100 for p in LATENCY_PERCENTILES]).unstack()
+    percentiles.columns = [f"p{p}_ms" for p in LATENCY_PERCENTILES]
+    summary = summary.join(percentiles)
+
+    summary["expected_latency_ms"] = (
+        (1 - summary["cold_start_rate"]) * summary["warm_mean_ms"].fillna(summary["cold_mean_ms"])
+        + summary["cold_start_rate"] * summary["cold_mean_ms"].fillna(0)
+    )
+    matrix = summary.index.to_series().str.extract(FUNCTION_NAME_PATTERN)
+    summary.insert(0, "method", matrix["method"])
+    summary.insert(1, "runtime", matrix["runtime"])
+    summary.insert(2, "architecture", matrix["architecture"].fillna(DEFAULT_ARCHITECTURE) if architecture is None
+                   else architecture)
+
+    if price_per_gb_second is None:
+        price_per_gb_second = summary["architecture"].map(PRICE_PER_GB_SECOND)
+    summary["cost_per_million_usd"] = (
+        summary["gb_seconds_per_invocation"] * price_per_gb_second * 1_000_000 + price_per_million_requests
+    )
+    summary["memory_headroom"] = 1 - summary["max_memory_used_mb"] / summary["memory_size_mb"]
+    summary["pareto"] = pareto_frontier(summary["cost_per_million_usd"], summary["expected_latency_ms"])
+    return summary.sort_values(["method", "runtime", "architecture", "memory_size_mb"])
+
+
+def pareto_frontier(cost: pd.Series, latency: pd.Series) -> pd.Series:
+    """
+    True for configurations that no other configuration beats on both cost and latency
+    """
+    order = np.lexsort((latency.values, cost.values))
+    on_frontier = np.zeros(len(cost), dtype=bool)
+    best_latency = np.inf
+    for position in order:
+        if latency.values[position] < best_latency:
+            on_frontier[position] = True
+            best_latency = latency.values[position]
+    return pd.Series(on_frontier, index=cost.index)
+
+
+def recommend(summary: pd.DataFrame, slo_ms: float, slo_stat: str = "p99_ms", min_memory_headroom: float = 0.1):
+    """
+    The cheapest configuration meeting the latency SLO with some memory headroom, or None if none does
+    """
+    candidates = summary[(summary[slo_stat] <= slo_ms) & (summary["memory_headroom"] >= min_memory_headroom)]
+    if candidates.empty:
+        return None
+    return candidates.sort_values(["cost_per_million_usd", "expected_latency_ms"]).iloc[0]
@@ -0,0 +1,96 @@
+"""
+Synthetic order generation with NumPy and PyArrow only, so it can be used without importing pandas.
+
+datagen.generate_orders builds its DataFrame from the same arrays, so both produce identical data for a seed.
+
+pa.array() imports pandas when it is installed, to check whether its input is a pandas object, so arrays are
+built from their buffers instead.
+"""
+
+import numpy as np
+import pyarrow as pa
+
+PRODUCT_CATEGORIES = ['Electronics', 'Clothing', 'Home & Kitchen', 'Sports', 'Toys']
+DEFAULT_NUM_ROWS = 1000
+MAX_NUM_ROWS = 50_000_000
+PURCHASE_DATE_RANGE_DAYS = 365
+
+# The schema of pa.Table.from_pandas(datagen.generate_orders(...)), without the pandas metadata
+ORDERS_SCHEMA = pa.schema([
+    ('Order ID', pa.int64()),
+    ('Product Category', pa.dictionary(pa.int8(), pa.string())),
+    ('Quantity Sold', pa.int64()),
+    ('Unit Price', pa.float64()),
+    ('Purchase Date', pa.date32()),
+])
+
+
+def _from_numpy(values: np.ndarray, type: pa.DataType) -> pa.Array:
+    return pa.Array.from_buffers(type, len(values), [None, pa.py_buffer(np.ascontiguousarray(values))])
+
+
+def _string_array(values) -> pa.Array:
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int32)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return pa.Array.from_buffers(pa.string(), len(encoded),
+                                 [None, pa.py_buffer(offsets), pa.py_buffer(b''.join(encoded))])
+
+
+def make_rng(seed=None) -> np.random.Generator:
+    return np.random.default_rng(seed)
+
+
+def num_rows_from_event(event, default: int = DEFAULT_NUM_ROWS) -> int:
+    num_rows = int((event or {}).get('num_rows', default))
+    if not 0 < num_rows <= MAX_NUM_ROWS:
+        raise ValueError(f"num_rows must be between 1 and {MAX_NUM_ROWS}, got {num_rows}")
+    return num_rows
+
+
+def generate_order_arrays(num_rows: int = DEFAULT_NUM_ROWS, rng: np.random.Generator = None,
+                          start_order_id: int = 1, today=None) -> dict:
+    """
+    The order columns as NumPy arrays, with categories as int8 codes into PRODUCT_CATEGORIES and purchase
+    dates as an Arrow date32 array
+    """
+    if rng is None:
+        rng = make_rng()
+    today = np.datetime64(today or 'today', 'D')
+
+    order_ids = np.arange(start_order_id, start_order_id + num_rows, dtype=np.int64)
+    category_codes = rng.integers(0, len(PRODUCT_CATEGORIES), size=num_rows, dtype=np.int8)
+    quantities = rng.integers(1, 11, size=num_rows, dtype=np.int64)
+    unit_prices = rng.uniform(10, 1000, size=num_rows).round(2)
+
+    # Random purchase dates within the last year, using datetime64 arithmetic
+    days_ago = rng.integers(0, PURCHASE_DATE_RANGE_DAYS, size=num_rows).astype('timedelta64[D]')
+    purchase_dates = _from_numpy((today - days_ago).astype(np.int32), pa.date32())
+
+    return {
+        'Order ID': order_ids,
+        'Product Category': category_codes,
+        'Quantity Sold': quantities,
+        'Unit Price': unit_prices,
+        'Purchase Date': purchase_dates,
+    }
+
+
+def generate_orders_table(num_rows: int = DEFAULT_NUM_ROWS, rng: np.random.Generator = None,
+                          start_order_id: int = 1, today=None) -> pa.Table:
+    """
+    Generate synthetic orders directly as an Arrow table with ORDERS_SCHEMA.
+
+    The NumPy arrays are wrapped without copying, and the category codes become the indices of a
+    dictionary array, so no string values are materialised.
+    """
+    arrays = generate_order_arrays(num_rows, rng, start_order_id, today)
+    arrays['Product Category'] = pa.DictionaryArray.from_buffers(
+        ORDERS_SCHEMA.field('Product Category').type, num_rows,
+        [None, pa.py_buffer(arrays['Product Category'])], _string_array(PRODUCT_CATEGORIES),
+    )
+    return pa.Table.from_arrays(
+        [arrays[name] if isinstance(arrays[name], pa.Array) else _from_numpy(arrays[name], field.type)
+         for name, field in zip(ORDERS_SCHEMA.names, ORDERS_SCHEMA)],
+        schema=ORDERS_SCHEMA,
+    )
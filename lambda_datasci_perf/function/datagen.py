@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from arrow_datagen import (  # noqa: F401
+    DEFAULT_NUM_ROWS,
+    MAX_NUM_ROWS,
+    PRODUCT_CATEGORIES,
+    PURCHASE_DATE_RANGE_DAYS,
+    generate_order_arrays,
+    make_rng,
+    num_rows_from_event,
+)
+
+
+def generate_orders(num_rows: int = DEFAULT_NUM_ROWS, rng: np.random.Generator = None, start_order_id: int = 1,
+                    today=None) -> pd.DataFrame:
+    """
+    Generate synthetic orders without any per-row Python code.
+
+    'Product Category' is categorical and 'Purchase Date' is an Arrow-backed date32 column, so both
+    convert to Arrow (dictionary<int8, string> and date32) without materialising Python objects.
+    """
+    arrays = generate_order_arrays(num_rows, rng, start_order_id, today)
+    return pd.DataFrame({
+        'Order ID': arrays['Order ID'],
+        'Product Category': pd.Categorical.from_codes(arrays['Product Category'], categories=PRODUCT_CATEGORIES),
+        'Quantity Sold': arrays['Quantity Sold'],
+        'Unit Price': arrays['Unit Price'],
+        'Purchase Date': pd.Series(arrays['Purchase Date'], dtype=pd.ArrowDtype(pa.date32())),
+    })
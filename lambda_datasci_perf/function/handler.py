@@ -1,23 +1,64 @@
+from import_profiler import ImportProfiler
+from memory import peak_rss_bytes, start_tracemalloc
 from timed_import import ImportTimer
 from timing import Timer
 
+# Installed before any timed import when IMPORT_PROFILE is set, so the nested import tree is captured
+import_profiler = ImportProfiler.from_env()
+# Python allocations are traced from here on when MEMORY_PROFILE is set
+start_tracemalloc()
 import_timer = ImportTimer()
 
 base64 = import_timer.import_module('base64')
 os = import_timer.import_module('os')
 sys = import_timer.import_module('sys')
 
-dt = import_timer.import_module('datetime')
-datetime = dt.datetime
-timedelta = dt.timedelta
+# The pandas-free variant builds the orders table directly with Arrow and never imports pandas
+ARROW_NATIVE = os.environ.get('ARROW_NATIVE', '').lower() in ('1', 'true', 'yes')
+# Uploads run on a persistent thread, overlapping response building, logging and metrics flushing
+BACKGROUND_UPLOAD = os.environ.get('BACKGROUND_UPLOAD', '').lower() in ('1', 'true', 'yes')
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 2))
+UPLOAD_POOL_CONNECTIONS = int(os.environ.get('UPLOAD_POOL_CONNECTIONS', 8))
+# Callers that replace s3_client after import (e.g. scripts/local-bench.py) set this to false and call
+# warm_up_uploads() themselves, so the warm-up runs on the client that is actually used
+S3_WARMUP = os.environ.get('S3_WARMUP', 'true').lower() in ('1', 'true', 'yes')
 
 json = import_timer.import_module('json')
 boto3 = import_timer.import_module('boto3')
 np = import_timer.import_module('numpy')
-pd = import_timer.import_module('pandas')
-pa = import_timer.import_module('pyarrow')
-pq = import_timer.import_module('pyarrow.parquet').parquet
+pa = import_timer.import_module('pyarrow', depends_on=(np,))
+pq = import_timer.import_module('pyarrow.parquet', depends_on=(pa,))
 powertools = import_timer.import_module('aws_lambda_powertools')
+# Imported after its own dependencies so its timing covers only the module itself
+arrow_datagen = import_timer.import_module('arrow_datagen', depends_on=(np, pa))
+parquet_options = import_timer.import_module('parquet_options')
+parquet_writer = import_timer.import_module('parquet_writer', depends_on=(pa, pq, parquet_options))
+if not ARROW_NATIVE:
+    pd = import_timer.import_module('pandas', depends_on=(np,))
+    pacsv = import_timer.import_module('pyarrow.csv', depends_on=(pa,))
+    datagen = import_timer.import_module('datagen', depends_on=(np, pd, pa, arrow_datagen))
+    streaming = import_timer.import_module('streaming', depends_on=(pa, pq, datagen, parquet_options))
+    phases = import_timer.import_module('phases')
+    workloads = import_timer.import_module('workloads', depends_on=(pd, pa, pacsv, pq, datagen, streaming,
+                                                                   parquet_writer, phases))
+spans = import_timer.import_module('spans')
+if BACKGROUND_UPLOAD:
+    futures = import_timer.import_module('concurrent.futures')
+    botocore_config = import_timer.import_module('botocore.config', depends_on=(boto3,))
+
+
+def create_s3_client():
+    session = boto3.session.Session()
+    if BACKGROUND_UPLOAD:
+        # Enough pooled connections for every upload thread, kept alive so that warm invocations reuse them
+        return session.client('s3', config=botocore_config.Config(
+            max_pool_connections=UPLOAD_POOL_CONNECTIONS, tcp_keepalive=True,
+        ))
+    return session.client('s3')
+
+
+# With PARALLEL_IMPORTS, the client is created on the import thread pool, overlapping the remaining imports
+s3_client_future = import_timer.submit('boto3_init', create_s3_client, depends_on=(boto3,))
 
 powertools_timer = Timer()
 with powertools_timer:
@@ -26,75 +67,321 @@ with powertools_timer:
     metrics = powertools.Metrics()
 powertools_init_time = powertools_timer.elapsed_us
 
-boto3_timer = Timer()
-with boto3_timer:
-    session = boto3.session.Session()
-    s3_client = session.client('s3')
-boto3_init_time = boto3_timer.elapsed_us
+s3_client = s3_client_future.result()
+boto3_init_time = import_timer.threads['boto3_init']['wall_us']
+import_timer.wait()
 
-cold_start = powertools.metrics.provider.cold_start
 
 BUCKET_NAME = os.environ['BUCKET_NAME']
+DATA_SEED = os.environ.get('DATA_SEED')
+IMPORT_PROFILE_TOP_N = 25
+# 'reference' returns bucket/key/size/ETag for the uploaded object, 'inline' returns the Parquet data as base64
+RESPONSE_MODE = os.environ.get('RESPONSE_MODE', 'reference')
+PRESIGN_EXPIRY_SECONDS = 3600
+# Lambda's synchronous response payload limit, less some headroom for the JSON envelope
+MAX_INLINE_BYTES = 6 * 1024 * 1024 - 1024
+DEFAULT_WORKLOAD = 'write'
 
-@logger.inject_lambda_context
-@tracer.capture_lambda_handler
-@metrics.log_metrics(capture_cold_start_metric=True)
-def handle_event(_event, _context):
-    if (cold_start):
-        all_timings = {
-            **import_timer.timings,
-            "powertools_init_time": powertools_init_time,
-            "boto3_init_time": boto3_init_time
-        }
-        logger.info("module_timings", extra={"timings": all_timings})
-        for mod, elapsed_us in all_timings.items():
-            module_identifier = mod.replace('.', '_')
-            metrics.add_metric(name=f"module_load_{module_identifier}", unit="Microseconds", value=elapsed_us)
 
-    logger.info('Python version', extra={"version": sys.version})
-    # Generate some random data
-    order_ids = range(1, 1001)
-    product_categories = ['Electronics', 'Clothing', 'Home & Kitchen', 'Sports', 'Toys']
-    category = np.random.choice(product_categories, 1000)
-    quantities = np.random.randint(1, 11, size=1000)
-    unit_prices = np.random.uniform(10, 1000, size=1000).round(2)
-
-    # Generate random purchase dates within the last year
-    base_date = datetime.today()
-    purchase_dates = [base_date - timedelta(days=np.random.randint(0, 365)) for _ in range(1000)]
-
-    # Create the DataFrame
-    df = pd.DataFrame({
-        'Order ID': order_ids,
-        'Product Category': category,
-        'Quantity Sold': quantities,
-        'Unit Price': unit_prices,
-        'Purchase Date': purchase_dates
-    })
-
-    # Format the 'Purchase Date' column to a more readable format
-    df['Purchase Date'] = pd.to_datetime(df['Purchase Date']).dt.strftime('%Y-%m-%d')
+def warm_up_s3():
+    # Opens a pooled connection to the bucket, so the first upload skips DNS, TCP and TLS setup
+    timer = Timer()
+    with timer:
+        try:
+            s3_client.head_bucket(Bucket=BUCKET_NAME)
+        except Exception as error:
+            logger.warning("S3 warm-up failed", extra={"error": str(error)})
+    return timer.elapsed_us
 
-    # Create parquet data
-    table = pa.Table.from_pandas(df)
-    buf = pa.BufferOutputStream()
-    pq.write_table(table, buf)
-    parquet_data = buf.getvalue().to_pybytes()
 
-    logger.info("DataFrame", extra={"df_head": df.head()})
+def warm_up_uploads():
+    # Run on the executor, which also starts its first thread during init rather than in the first invoke
+    global s3_warmup_time
+    s3_warmup_time = upload_executor.submit(warm_up_s3).result()
 
-    key = f"{_context.function_name}/{_context.aws_request_id}.parquet"
-    s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=parquet_data)
 
-    result = {
+upload_executor = None
+s3_warmup_time = None
+if BACKGROUND_UPLOAD:
+    upload_executor = futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+    if S3_WARMUP:
+        warm_up_uploads()
+
+default_rng = None
+# PARQUET_* environment variables, parsed and checked during init without pyarrow, and overridden by the event's
+# "parquet" object. The codec is validated against pyarrow in each invocation (see parquet_writer.validate).
+DEFAULT_PARQUET_OPTIONS = parquet_options.options_from_env()
+span_recorder = spans.SpanRecorder()
+
+
+def get_default_rng():
+    # Created on first use so that lazy imports of numpy are not forced during init
+    global default_rng
+    if default_rng is None:
+        default_rng = arrow_datagen.make_rng(int(DATA_SEED) if DATA_SEED else None)
+    return default_rng
+
+
+def log_module_timings():
+    all_timings = {
+        **import_timer.timings,
+        "powertools_init_time": powertools_init_time,
+        "boto3_init_time": boto3_init_time
+    }
+    if s3_warmup_time is not None:
+        all_timings["s3_warmup_time"] = s3_warmup_time
+    extra = {
+        "timings": all_timings,
+        "import_phases": import_timer.phases,
+        "lazy_imports": import_timer.lazy,
+        "parallel_imports": import_timer.parallel,
+        "import_threads": import_timer.threads,
+        "import_memory": import_timer.memory,
+    }
+    if import_profiler is not None:
+        import_profiler.uninstall()
+        extra["import_profile"] = [node.summary() for node in import_profiler.top(IMPORT_PROFILE_TOP_N)]
+    logger.info("module_timings", extra=extra)
+    for mod, elapsed_us in all_timings.items():
+        module_identifier = mod.replace('.', '_')
+        metrics.add_metric(name=f"module_load_{module_identifier}", unit="Microseconds", value=elapsed_us)
+    for phase, elapsed_us in import_timer.phase_totals().items():
+        metrics.add_metric(name=f"module_load_{phase}_total", unit="Microseconds", value=elapsed_us)
+    for mod, usage in import_timer.memory.items():
+        module_identifier = mod.replace('.', '_')
+        for field, value in usage.items():
+            metrics.add_metric(name=f"module_load_{module_identifier}_{field}", unit="Bytes", value=value)
+
+
+def base64_size(num_bytes: int):
+    return 4 * ((num_bytes + 2) // 3)
+
+
+def json_response(body: dict):
+    return {
         'statusCode': 200,
-        'body': json.dumps({
-            'parquet_data_base64': base64.b64encode(parquet_data).decode('utf-8')
-        }),
+        'body': json.dumps(body),
         'headers': {
             'Content-Type': 'application/json',
         },
     }
 
-    return result
 
+def upload_buffer(buf, key):
+    # BufferReader exposes the Arrow buffer as a seekable file object, so botocore streams it without a copy
+    response = s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=pa.BufferReader(buf), ContentLength=buf.size)
+    return {'bucket': BUCKET_NAME, 'key': key, 'size': buf.size, 'etag': response['ETag']}
+
+
+def timed_upload(buf, key):
+    timer = Timer()
+    with timer:
+        uploaded = upload_buffer(buf, key)
+    return uploaded, timer.elapsed_us
+
+
+def start_upload(buf, key):
+    # With BACKGROUND_UPLOAD, returns the running upload; otherwise the upload happens in upload_and_respond
+    if upload_executor is None:
+        return None
+    return upload_executor.submit(timed_upload, buf, key)
+
+
+class PendingResponse:
+    """
+    A response built while its upload is still running, completed by wait() once the object is durable
+    """
+
+    def __init__(self, upload, response=None, reference=None):
+        self.upload = upload
+        self.response = response
+        self.reference = reference
+
+    def wait(self) -> dict:
+        timer = Timer()
+        with timer:
+            uploaded, upload_us = self.upload.result()
+        span_recorder.record('upload', upload_us)
+        span_recorder.record('upload_wait', timer.elapsed_us)
+        # The part of the upload that ran concurrently with the rest of the invocation
+        span_recorder.record('upload_overlapped', max(upload_us - timer.elapsed_us, 0))
+        if self.reference is not None:
+            self.reference['etag'] = uploaded['etag']
+            self.response = json_response(self.reference)
+        return self.response
+
+
+def add_presigned_url(uploaded: dict, event):
+    # Signing is local, so it does not need the object to exist yet
+    if event.get('presign'):
+        uploaded['presigned_url'] = s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': uploaded['bucket'], 'Key': uploaded['key']},
+            ExpiresIn=int(event.get('presign_expiry_seconds', PRESIGN_EXPIRY_SECONDS)),
+        )
+
+
+def object_reference_response(uploaded: dict, event):
+    add_presigned_url(uploaded, event)
+    return json_response(uploaded)
+
+
+def wants_inline(buf, uploaded: dict, event) -> bool:
+    if event.get('response', RESPONSE_MODE) != 'inline':
+        return False
+    if base64_size(buf.size) <= MAX_INLINE_BYTES:
+        return True
+    logger.warning("Parquet data too large to return inline, returning an object reference", extra=uploaded)
+    return False
+
+
+def inline_response(buf):
+    # base64 output needs no JSON escaping, so the body is assembled directly instead of through json.dumps
+    encoded = base64.b64encode(buf).decode('ascii')
+    return {
+        'statusCode': 200,
+        'body': '{"parquet_data_base64": "' + encoded + '"}',
+        'headers': {
+            'Content-Type': 'application/json',
+        },
+    }
+
+
+def write_orders(num_rows, rng, key, event, options):
+    with span_recorder.span('generate'):
+        df = datagen.generate_orders(num_rows, rng)
+
+    # Create parquet data
+    with span_recorder.span('to_arrow'):
+        table = pa.Table.from_pandas(df)
+    with span_recorder.span('write_parquet'):
+        buf = pa.BufferOutputStream()
+        parquet_writer.write_table(table, buf, options)
+        parquet_data = buf.getvalue()
+
+    upload = start_upload(parquet_data, key)
+    with span_recorder.span('log'):
+        logger.info("DataFrame", extra={"df_head": df.head()})
+
+    return upload_and_respond(parquet_data, key, event, upload)
+
+
+def write_orders_arrow(num_rows, rng, key, event, options):
+    # Same data and schema as write_orders, without going through pandas
+    with span_recorder.span('generate'):
+        table = arrow_datagen.generate_orders_table(num_rows, rng)
+
+    with span_recorder.span('write_parquet'):
+        buf = pa.BufferOutputStream()
+        parquet_writer.write_table(table, buf, options)
+        parquet_data = buf.getvalue()
+
+    upload = start_upload(parquet_data, key)
+    with span_recorder.span('log'):
+        logger.info("Table", extra={"table_head": table.slice(0, 5).to_pydict()})
+
+    return upload_and_respond(parquet_data, key, event, upload)
+
+
+def upload_and_respond(parquet_data, key, event, upload=None):
+    if upload is not None:
+        # Everything but the ETag is known before the upload finishes, so the response is built now and
+        # completed by PendingResponse.wait
+        with span_recorder.span('encode_response'):
+            reference = {'bucket': BUCKET_NAME, 'key': key, 'size': parquet_data.size, 'etag': None}
+            if wants_inline(parquet_data, reference, event):
+                return PendingResponse(upload, response=inline_response(parquet_data))
+            add_presigned_url(reference, event)
+            return PendingResponse(upload, reference=reference)
+
+    with span_recorder.span('upload'):
+        uploaded = upload_buffer(parquet_data, key)
+
+    with span_recorder.span('encode_response'):
+        if wants_inline(parquet_data, uploaded, event):
+            return inline_response(parquet_data)
+        return object_reference_response(uploaded, event)
+
+
+def write_orders_streaming(num_rows, rng, key, event, options):
+    # Bounded-memory variant: each chunk becomes a row group, uploaded with S3 multipart upload as parts fill
+    uploaded = streaming.write_orders_streaming(
+        s3_client, BUCKET_NAME, key, num_rows, rng,
+        chunk_rows=int(event.get('chunk_rows', streaming.DEFAULT_CHUNK_ROWS)),
+        part_size=int(event.get('part_size', streaming.DEFAULT_PART_SIZE)),
+        spans=span_recorder,
+        options=options,
+    )
+    with span_recorder.span('log'):
+        logger.info("Streamed Parquet upload", extra=uploaded)
+    with span_recorder.span('encode_response'):
+        return object_reference_response(uploaded, event)
+
+
+def run_workload(workload, num_rows, rng, key, event, options):
+    # Phases are nested under the workload name, e.g. phase_read_read_parquet
+    with span_recorder.span(workload):
+        result = workloads.WORKLOADS[workload](s3_client, BUCKET_NAME, key, num_rows, rng, event, span_recorder,
+                                               options)
+        with span_recorder.span('log'):
+            logger.info("Workload result", extra=result)
+        with span_recorder.span('encode_response'):
+            return json_response(result)
+
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+@metrics.log_metrics(capture_cold_start_metric=True)
+def handle_event(_event, _context):
+    import_timer.start_invoke()
+    span_recorder.start_invocation()
+    event = _event or {}
+
+    logger.info('Python version', extra={"version": sys.version})
+    num_rows = arrow_datagen.num_rows_from_event(event)
+    rng = arrow_datagen.make_rng(event['seed']) if 'seed' in event else get_default_rng()
+    key = f"{_context.function_name}/{_context.aws_request_id}.parquet"
+    options = parquet_writer.validate(parquet_options.options_from_event(event, DEFAULT_PARQUET_OPTIONS))
+
+    workload = event.get('workload', DEFAULT_WORKLOAD)
+    if ARROW_NATIVE:
+        if workload != DEFAULT_WORKLOAD or event.get('streaming'):
+            raise ValueError("Only the non-streaming write workload is available with ARROW_NATIVE")
+        result = write_orders_arrow(num_rows, rng, key, event, options)
+    elif workload == DEFAULT_WORKLOAD:
+        if event.get('streaming'):
+            result = write_orders_streaming(num_rows, rng, key, event, options)
+        else:
+            result = write_orders(num_rows, rng, key, event, options)
+    elif workload in workloads.WORKLOADS:
+        result = run_workload(workload, num_rows, rng, key, event, options)
+    else:
+        raise ValueError(f"Unknown workload {workload!r}, expected one of: "
+                         f"{', '.join([DEFAULT_WORKLOAD, *workloads.WORKLOADS])}")
+
+    span_recorder.emit(metrics)
+    if span_recorder.sampled:
+        logger.info("phase_timings", extra={"phases": span_recorder.spans, "phase_memory": span_recorder.memory,
+                                            "parquet_options": options})
+
+    if import_timer.invocations == 1:
+        # Logged after the workload so that lazy imports resolved during the first invoke are included
+        log_module_timings()
+
+    if isinstance(result, PendingResponse):
+        # The metrics so far are flushed while the upload is in flight; the upload's timings follow in the
+        # final flush, after the handler returns
+        if metrics.metric_set:
+            with span_recorder.span('flush_metrics'):
+                metrics.flush_metrics()
+        result = result.wait()
+        span_recorder.emit(metrics)
+        if span_recorder.sampled:
+            logger.info("background_upload", extra={
+                name: span_recorder.spans.get(name)
+                for name in ('upload', 'upload_wait', 'upload_overlapped', 'flush_metrics')
+            })
+
+    # Added last so that it covers the whole invocation, and so the final flush is never empty
+    metrics.add_metric(name="peak_rss", unit="Bytes", value=peak_rss_bytes())
+    return result
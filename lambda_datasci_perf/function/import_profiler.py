@@ -0,0 +1,207 @@
+import json
+import os
+import sys
+import threading
+
+from timing import Timer
+
+
+class ImportNode:
+    def __init__(self, name: str, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.find_us = 0
+        self.exec_us = 0
+
+    @property
+    def cumulative_us(self):
+        return self.find_us + self.exec_us
+
+    @property
+    def self_us(self):
+        return self.cumulative_us - sum(child.cumulative_us for child in self.children)
+
+    def path(self):
+        node, names = self, []
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return list(reversed(names))
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "self_us": self.self_us,
+            "cumulative_us": self.cumulative_us,
+            "find_us": self.find_us,
+            "exec_us": self.exec_us,
+        }
+
+    def to_dict(self):
+        return {
+            **self.summary(),
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _ProfilingLoader:
+    """
+    Wraps a module's loader to time create_module/exec_module and to make nested imports children of this module
+    """
+
+    def __init__(self, profiler, node: ImportNode, loader):
+        self._profiler = profiler
+        self._node = node
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        timer = Timer()
+        with timer:
+            with self._profiler._within(self._node):
+                module = self._loader.create_module(spec)
+        self._node.exec_us += timer.elapsed_us
+        return module
+
+    def exec_module(self, module):
+        # Restore the real loader so that the module (and importlib.resources) never sees the wrapper
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        timer = Timer()
+        with timer:
+            with self._profiler._within(self._node):
+                self._loader.exec_module(module)
+        self._node.exec_us += timer.elapsed_us
+
+
+class _Within:
+    def __init__(self, stack, node):
+        self.stack = stack
+        self.node = node
+
+    def __enter__(self):
+        self.stack.append(self.node)
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stack.pop()
+
+
+class ImportProfiler:
+    """
+    sys.meta_path hook that records the full tree of nested imports with find-spec and load/exec times per module
+    """
+
+    def __init__(self):
+        self.root = ImportNode("<root>")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        An installed profiler when IMPORT_PROFILE is enabled in the environment, otherwise None
+        """
+        if os.environ.get("IMPORT_PROFILE", "").lower() not in ("1", "true", "yes"):
+            return None
+        profiler = cls()
+        profiler.install()
+        return profiler
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.uninstall()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        finding = self._finding()
+        if fullname in finding:
+            return None
+        parent = self._stack()[-1]
+        node = ImportNode(fullname, parent)
+        spec = None
+        finding.add(fullname)
+        timer = Timer()
+        try:
+            with timer:
+                for finder in list(sys.meta_path):
+                    if finder is self or not hasattr(finder, "find_spec"):
+                        continue
+                    spec = finder.find_spec(fullname, path, target)
+                    if spec is not None:
+                        break
+        finally:
+            finding.discard(fullname)
+        if spec is None:
+            return None
+        node.find_us = timer.elapsed_us
+        with self._lock:
+            parent.children.append(node)
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _ProfilingLoader(self, node, spec.loader)
+        return spec
+
+    def nodes(self):
+        return [node for node in self.root.walk() if node is not self.root]
+
+    def top(self, n: int = 20, key: str = "self_us"):
+        return sorted(self.nodes(), key=lambda node: getattr(node, key), reverse=True)[:n]
+
+    def total_us(self):
+        return sum(child.cumulative_us for child in self.root.children)
+
+    def to_json(self, **kwargs):
+        return json.dumps([child.to_dict() for child in self.root.children], **kwargs)
+
+    def collapsed_stacks(self):
+        """
+        Lines in the collapsed-stack format consumed by flamegraph.pl, speedscope and similar tools
+        """
+        lines = []
+        for node in self.nodes():
+            self_us = int(node.self_us)
+            if self_us > 0:
+                lines.append(f"{';'.join(node.path())} {self_us}")
+        return "\n".join(lines)
+
+    def format_table(self, n: int = 20, key: str = "self_us"):
+        rows = [f"{'module':<50} {'self ms':>10} {'cum ms':>10} {'find ms':>10} {'exec ms':>10}"]
+        for node in self.top(n, key):
+            rows.append(
+                f"{node.name:<50} {node.self_us / 1000:>10.1f} {node.cumulative_us / 1000:>10.1f} "
+                f"{node.find_us / 1000:>10.1f} {node.exec_us / 1000:>10.1f}"
+            )
+        return "\n".join(rows)
+
+    def _within(self, node: ImportNode):
+        return _Within(self._stack(), node)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = [self.root]
+        return stack
+
+    def _finding(self):
+        finding = getattr(self._local, "finding", None)
+        if finding is None:
+            finding = self._local.finding = set()
+        return finding
@@ -1,15 +1,20 @@
+import argparse
+import json
+
+from import_profiler import ImportProfiler
 from timed_import import ImportTimer
+
 import_timer = ImportTimer()
 
-np = import_timer.import_module('numpy')
-pd = import_timer.import_module('pandas')
-pa = import_timer.import_module('pyarrow')
-pq = import_timer.import_module('pyarrow.parquet').parquet
-boto3 = import_timer.import_module('boto3')
-powertools = import_timer.import_module('aws_lambda_powertools')
-json = import_timer.import_module('json')
 
 def measure_import_time():
+    np = import_timer.import_module('numpy')
+    pd = import_timer.import_module('pandas')
+    pa = import_timer.import_module('pyarrow')
+    pq = import_timer.import_module('pyarrow.parquet')
+    boto3 = import_timer.import_module('boto3')
+    powertools = import_timer.import_module('aws_lambda_powertools')
+
     pd.DataFrame()
     np.array([])
     boto3.session.Session()
@@ -19,5 +24,32 @@ def measure_import_time():
     print(pq.write_table)
     return import_timer.timings
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import times for the handler's dependencies")
+    parser.add_argument("--top", type=int, help="Profile nested imports and print the N most expensive modules")
+    parser.add_argument("--sort", choices=("self_us", "cumulative_us", "find_us", "exec_us"), default="self_us")
+    parser.add_argument("--json", help="Write the nested import tree as JSON to this path")
+    parser.add_argument("--collapsed", help="Write collapsed stacks (for flamegraph.pl/speedscope) to this path")
+    args = parser.parse_args()
+
+    if not (args.top or args.json or args.collapsed):
+        print(json.dumps(measure_import_time(), indent=4))
+        return
+
+    with ImportProfiler() as profiler:
+        timings = measure_import_time()
+    print(json.dumps(timings, indent=4))
+
+    if args.top:
+        print(profiler.format_table(args.top, args.sort))
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(profiler.to_json(indent=2))
+    if args.collapsed:
+        with open(args.collapsed, "w") as f:
+            f.write(profiler.collapsed_stacks())
+
+
 if __name__ == "__main__":
-    print(json.dumps(measure_import_time(), indent=4))
\ No newline at end of file
+    main()
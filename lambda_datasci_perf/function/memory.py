@@ -0,0 +1,88 @@
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def memory_profile_enabled() -> bool:
+    return os.environ.get("MEMORY_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+def start_tracemalloc():
+    """
+    Start tracing Python allocations when MEMORY_PROFILE is set. Tracing slows allocation-heavy code, so it is opt-in.
+    """
+    if memory_profile_enabled() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+
+def peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def arrow_allocated_bytes():
+    # Only inspect pyarrow once something else has imported it, so that measuring never forces the import.
+    # The pool's max_memory() is a high-water mark for the whole process, so only the allocation delta is used.
+    pa = sys.modules.get("pyarrow")
+    if pa is None or not hasattr(pa, "total_allocated_bytes"):
+        return None
+    return pa.total_allocated_bytes()
+
+
+# tracemalloc's peak is process-wide, and each probe resets it when it starts. Probes that are open at the
+# time (enclosing spans, or imports on other threads) first fold the peak so far into their own.
+_active_probes = set()
+_active_probes_lock = threading.Lock()
+
+
+class MemoryProbe:
+    """
+    Memory used between start() and stop(): RSS delta, the tracemalloc peak (if tracing) and Arrow pool delta
+    """
+
+    def start(self):
+        self.rss_start = rss_bytes()
+        self.arrow_start = arrow_allocated_bytes()
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            with _active_probes_lock:
+                _, traced_peak = tracemalloc.get_traced_memory()
+                for probe in _active_probes:
+                    probe.traced_peak = max(probe.traced_peak, traced_peak)
+                tracemalloc.reset_peak()
+                self.traced_start, self.traced_peak = tracemalloc.get_traced_memory()
+                _active_probes.add(self)
+
+    def stop(self) -> dict:
+        usage = {}
+        rss_end = rss_bytes()
+        if rss_end is not None and self.rss_start is not None:
+            usage["rss_delta_bytes"] = rss_end - self.rss_start
+        if self.tracing:
+            with _active_probes_lock:
+                _active_probes.discard(self)
+                _, traced_peak = tracemalloc.get_traced_memory()
+            usage["py_peak_bytes"] = max(self.traced_peak, traced_peak) - self.traced_start
+        arrow_end = arrow_allocated_bytes()
+        if arrow_end is not None:
+            usage["arrow_delta_bytes"] = arrow_end - (self.arrow_start or 0)
+        return usage
+
+
+def merge_usage(previous: dict, usage: dict) -> dict:
+    # Repeated measurements of the same thing (e.g. one span per chunk) keep the largest value of each field
+    if not previous:
+        return usage
+    return {key: max(previous.get(key, value), value) for key, value in usage.items()}
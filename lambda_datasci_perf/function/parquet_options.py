@@ -0,0 +1,92 @@
+"""
+Parquet writer options, set with PARQUET_* environment variables and overridden per invocation with
+{"parquet": {...}} in the event, e.g. {"parquet": {"compression": "zstd", "compression_level": 3}}.
+
+Options that are not set keep pyarrow's defaults, so an empty configuration writes exactly what
+pq.write_table(table, sink) does.
+
+This module only parses and checks the plain values, without importing pyarrow, so the handler can read its
+defaults during init. Checks that need pyarrow, and writing, are in parquet_writer.py.
+"""
+
+import os
+
+COMPRESSION_CODECS = ('none', 'snappy', 'gzip', 'brotli', 'zstd', 'lz4')
+
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in TRUE_VALUES
+
+
+def _parse_use_dictionary(value):
+    # Either a flag for every column or the columns to dictionary-encode, as a list or comma-separated
+    if isinstance(value, (bool, list)):
+        return value
+    if str(value).lower() in TRUE_VALUES + FALSE_VALUES:
+        return _parse_bool(value)
+    return [column.strip() for column in str(value).split(',')]
+
+
+# Option name -> parser. Each is read from PARQUET_<NAME> and from the event's "parquet" object.
+OPTIONS = {
+    'compression': str.lower,
+    'compression_level': int,
+    'use_dictionary': _parse_use_dictionary,
+    'write_statistics': _parse_bool,
+    'row_group_size': int,
+    'data_page_size': int,
+}
+
+
+def options_from_env(environ=None) -> dict:
+    environ = os.environ if environ is None else environ
+    return check({
+        name: parse(environ[f'PARQUET_{name.upper()}'])
+        for name, parse in OPTIONS.items() if f'PARQUET_{name.upper()}' in environ
+    })
+
+
+def check(options: dict) -> dict:
+    """
+    Check option names and values. Whether the codec is available in this pyarrow build is checked by
+    parquet_writer.validate.
+    """
+    unknown = set(options) - set(OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown Parquet options {', '.join(sorted(unknown))}, expected: {', '.join(OPTIONS)}")
+    codec = options.get('compression', 'snappy')
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError(f"Unsupported compression {codec!r}, expected one of: {', '.join(COMPRESSION_CODECS)}")
+    if options.get('compression_level') is not None and codec == 'none':
+        raise ValueError("Compression 'none' does not support a compression level")
+    for name in ('row_group_size', 'data_page_size'):
+        if name in options and options[name] <= 0:
+            raise ValueError(f"{name} must be positive, got {options[name]}")
+    return options
+
+
+def options_from_event(event, defaults: dict = None) -> dict:
+    """
+    The environment's options (or defaults), updated with the event's "parquet" object and checked
+    """
+    overrides = (event or {}).get('parquet') or {}
+    options = dict(options_from_env() if defaults is None else defaults)
+    if 'compression' in overrides and 'compression_level' not in overrides:
+        # A level configured for the default codec rarely makes sense for another one
+        options.pop('compression_level', None)
+    options.update({name: OPTIONS[name](value) if name in OPTIONS else value for name, value in overrides.items()})
+    return check(options)
+
+
+def writer_kwargs(options: dict) -> dict:
+    """
+    Keyword arguments for pq.ParquetWriter. row_group_size is an argument of each write instead.
+    """
+    return {name: value for name, value in options.items() if name != 'row_group_size'}
+
@@ -0,0 +1,26 @@
+"""
+Writing Parquet with the options from parquet_options.py, and the checks on them that need pyarrow
+"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import parquet_options
+
+
+def validate(options: dict) -> dict:
+    """
+    Check the options, including whether this pyarrow build has the codec and supports a level for it
+    """
+    parquet_options.check(options)
+    codec = options.get('compression', 'snappy')
+    if codec != 'none' and not pa.Codec.is_available(codec):
+        raise ValueError(f"Compression {codec!r} is not available in this pyarrow build")
+    if options.get('compression_level') is not None and not pa.Codec.supports_compression_level(codec):
+        raise ValueError(f"Compression {codec!r} does not support a compression level")
+    return options
+
+
+def write_table(table: pa.Table, where, options: dict, **kwargs):
+    pq.write_table(table, where, row_group_size=options.get('row_group_size'),
+                   **parquet_options.writer_kwargs(options), **kwargs)
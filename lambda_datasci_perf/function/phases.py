@@ -0,0 +1,31 @@
+"""
+Names of the spans recorded by handle_event and by each workload, emitted as phase_<name> metrics (see spans.py).
+
+The stack imports this module to build a dashboard widget for every phase, so it must only use the standard library.
+"""
+
+# Spans of the write workload, recorded directly under handle_event
+HANDLER_PHASES = ("generate", "to_arrow", "write_parquet", "log", "upload", "encode_response",
+                  "upload_wait", "upload_overlapped", "flush_metrics")
+
+# Spans recorded inside each workload of workloads.WORKLOADS, which only registers workloads declared here
+WORKLOAD_PHASES = {
+    "read": ("prepare", "read_parquet", "to_pandas"),
+    "groupby": ("generate", "groupby"),
+    "csv_to_parquet": ("prepare", "download", "parse_csv", "write_parquet", "upload"),
+    "join": ("generate", "join", "aggregate"),
+}
+
+# Spans recorded by handler.run_workload after the workload returns, nested under the workload name like its own
+WORKLOAD_RESULT_PHASES = ("log", "encode_response")
+
+
+def phase_names() -> list:
+    """
+    Every phase metric name without its phase_ prefix, e.g. read_read_parquet for the read workload's read_parquet span
+    """
+    names = list(HANDLER_PHASES)
+    for workload, phases in WORKLOAD_PHASES.items():
+        names.append(workload)
+        names.extend(f"{workload}_{phase}" for phase in (*phases, *WORKLOAD_RESULT_PHASES))
+    return names
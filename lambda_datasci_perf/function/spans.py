@@ -0,0 +1,100 @@
+import os
+import random
+
+from memory import MemoryProbe, memory_profile_enabled, merge_usage
+from timing import Timer
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Span(Timer):
+    def __init__(self, recorder, name: str):
+        super().__init__()
+        self.recorder = recorder
+        self.name = name
+        self.probe = MemoryProbe() if recorder.track_memory else None
+
+    def __enter__(self):
+        self.recorder._stack.append(self.name)
+        if self.probe is not None:
+            self.probe.start()
+        super().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        super().__exit__(exc_type, exc_value, exc_tb)
+        path = ".".join(self.recorder._stack)
+        self.recorder._stack.pop()
+        # Spans entered more than once (e.g. per chunk) accumulate
+        self.recorder.spans[path] = self.recorder.spans.get(path, 0) + self.elapsed_us
+        if self.probe is not None:
+            self.recorder.memory[path] = merge_usage(self.recorder.memory.get(path), self.probe.stop())
+        return False
+
+
+class SpanRecorder:
+    """
+    Nested, per-invocation phase timings built on Timer.
+
+    Spans are only recorded for a sampled fraction of invocations (SPAN_SAMPLE_RATE, default 1.0); the rest
+    get a shared no-op context manager so the instrumentation costs next to nothing. Memory is only measured per
+    span when MEMORY_PROFILE is set, since each measured span adds up to three metrics.
+    """
+
+    def __init__(self, sample_rate: float = None, track_memory: bool = None):
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("SPAN_SAMPLE_RATE", 1.0))
+        if track_memory is None:
+            track_memory = memory_profile_enabled()
+        self.sample_rate = sample_rate
+        self.track_memory = track_memory
+        self.sampled = False
+        self.spans = {}
+        self.memory = {}
+        self._stack = []
+        self._emitted = set()
+
+    def start_invocation(self):
+        self.sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        self.spans = {}
+        self.memory = {}
+        self._stack = []
+        self._emitted = set()
+
+    def span(self, name: str):
+        if not self.sampled:
+            return NOOP_SPAN
+        return _Span(self, name)
+
+    def record(self, name: str, elapsed_us: float):
+        """
+        Add a duration measured elsewhere, e.g. on another thread, nested under the spans currently open
+        """
+        if not self.sampled:
+            return
+        path = ".".join([*self._stack, name])
+        self.spans[path] = self.spans.get(path, 0) + elapsed_us
+
+    def emit(self, metrics):
+        # Spans already emitted in this invocation are skipped, so spans that end later can be emitted afterwards
+        for path, elapsed_us in self.spans.items():
+            if path in self._emitted:
+                continue
+            self._emitted.add(path)
+            metric_prefix = f"phase_{path.replace('.', '_')}"
+            metrics.add_metric(name=metric_prefix, unit="Microseconds", value=elapsed_us)
+            for field, value in self.memory.get(path, {}).items():
+                metrics.add_metric(name=f"{metric_prefix}_{field}", unit="Bytes", value=value)
+
+
+# Used where no recorder is passed in, e.g. when calling the streaming writer outside the handler
+NOOP_RECORDER = SpanRecorder(sample_rate=0, track_memory=False)
@@ -0,0 +1,195 @@
+import io
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import datagen
+import parquet_options
+import spans as spans_module
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = int(os.environ.get('STREAMING_PART_SIZE', 8 * 1024 * 1024))
+DEFAULT_CHUNK_ROWS = int(os.environ.get('STREAMING_CHUNK_ROWS', 250_000))
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    Write-only file object that uploads to S3 with a multipart upload as each part fills.
+
+    At most one part is buffered at a time, so memory use is bounded by part_size regardless of the object size.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int = DEFAULT_PART_SIZE):
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes, got {part_size}")
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.position = 0
+        self.parts = []
+        self.etag = None
+        self._buffer = bytearray()
+        self._upload_id = None
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        data = memoryview(data).cast('B')
+        self._buffer += data
+        self.position += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = self._buffer[:self.part_size]
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._complete()
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            super().close()
+
+    def abort(self):
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+        self._buffer = bytearray()
+        super().close()
+
+    def _upload_part(self, body):
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key)
+            self._upload_id = response['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=part_number, Body=bytes(body)
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    def _complete(self):
+        if self._upload_id is None:
+            # Everything fitted in a single part, so a plain PUT is cheaper than a multipart upload
+            response = self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._upload_part(self._buffer)
+            response = self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={'Parts': self.parts}
+            )
+            self._upload_id = None
+        self._buffer = bytearray()
+        self.etag = response.get('ETag')
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only, seekable file object that fetches each read with a ranged GET.
+
+    Parquet readers only fetch the footer and the column chunks they need, so column projection and row group
+    pruning cut the bytes transferred from S3 as well as the decoding work.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, size: int = None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        if size is None:
+            size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.size = size
+        self.position = 0
+        self.requests = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def readinto(self, b):
+        length = min(len(b), self.size - self.position)
+        if length <= 0:
+            return 0
+        response = self.s3_client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f'bytes={self.position}-{self.position + length - 1}'
+        )
+        data = response['Body'].read()
+        b[:len(data)] = data
+        self.position += len(data)
+        self.requests += 1
+        self.bytes_read += len(data)
+        return len(data)
+
+
+def write_orders_streaming(s3_client, bucket: str, key: str, num_rows: int, rng=None,
+                           chunk_rows: int = DEFAULT_CHUNK_ROWS, part_size: int = DEFAULT_PART_SIZE,
+                           spans=None, options=None) -> dict:
+    """
+    Generate orders in chunks of chunk_rows, writing each chunk as a Parquet row group that is streamed to S3.
+
+    options are parquet_options writer options. A row_group_size smaller than chunk_rows splits each chunk
+    into several row groups.
+    """
+    if rng is None:
+        rng = datagen.make_rng()
+    if spans is None:
+        spans = spans_module.NOOP_RECORDER
+    options = options or {}
+    row_group_size = min(options.get('row_group_size', chunk_rows), chunk_rows)
+    sink = S3MultipartWriter(s3_client, bucket, key, part_size)
+    writer = None
+    row_groups = 0
+    try:
+        for start in range(0, num_rows, chunk_rows):
+            with spans.span('generate'):
+                df = datagen.generate_orders(min(chunk_rows, num_rows - start), rng, start_order_id=start + 1)
+            with spans.span('to_arrow'):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+            del df
+            # Includes uploading any parts that fill up during the write
+            with spans.span('write_parquet'):
+                if writer is None:
+                    writer = pq.ParquetWriter(sink, table.schema, **parquet_options.writer_kwargs(options))
+                writer.write_table(table, row_group_size=row_group_size)
+            row_groups += -(-table.num_rows // row_group_size)
+        with spans.span('write_parquet'):
+            if writer is not None:
+                writer.close()
+    except Exception:
+        sink.abort()
+        raise
+    with spans.span('upload'):
+        sink.close()
+    return {
+        'bucket': bucket,
+        'key': key,
+        'num_rows': num_rows,
+        'row_groups': row_groups,
+        'parts': max(len(sink.parts), 1),
+        'size': sink.position,
+        'etag': sink.etag,
+    }
@@ -1,12 +1,175 @@
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from memory import MemoryProbe, memory_profile_enabled
 from timing import Timer
 
+PHASE_INIT = "init"
+PHASE_INVOKE = "invoke"
+
+DEFAULT_PARALLEL_WORKERS = 4
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+class LazyModule:
+    """
+    Stand-in for a module that performs the real (timed) import on first attribute access
+    """
+
+    def __init__(self, import_timer, module_name: str, depends_on=()):
+        object.__setattr__(self, "_import_timer", import_timer)
+        object.__setattr__(self, "_module_name", module_name)
+        object.__setattr__(self, "_depends_on", tuple(depends_on))
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        mod = object.__getattribute__(self, "_module")
+        if mod is None:
+            # Resolve dependencies first so that each import is timed on its own
+            for dependency in object.__getattribute__(self, "_depends_on"):
+                if isinstance(dependency, LazyModule):
+                    dependency._load()
+            import_timer = object.__getattribute__(self, "_import_timer")
+            mod = import_timer._resolve(object.__getattribute__(self, "_module_name"))
+            object.__setattr__(self, "_module", mod)
+        return mod
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        mod = object.__getattribute__(self, "_module")
+        if mod is None:
+            return f"<lazy module '{object.__getattribute__(self, '_module_name')}' (not loaded)>"
+        return repr(mod)
+
+
 class ImportTimer:
-    def __init__(self):
+    def __init__(self, lazy: bool = None, parallel: bool = None, max_workers: int = None, track_memory: bool = None):
+        if lazy is None:
+            lazy = _env_flag("LAZY_IMPORTS")
+        if parallel is None:
+            parallel = _env_flag("PARALLEL_IMPORTS")
+        if track_memory is None:
+            # Memory probes add their own overhead to every import timing, so they are opt-in
+            track_memory = memory_profile_enabled()
+        self.lazy = lazy
+        self.parallel = parallel
+        self.track_memory = track_memory
+        self.phase = PHASE_INIT
         self.timings = {}
+        self.phases = {}
+        self.threads = {}
+        self.memory = {}
+        self.invocations = 0
+        self._start_ns = time.monotonic_ns()
+        self._futures = {}
+        self._executor = None
+        if parallel:
+            max_workers = max_workers or int(os.environ.get("PARALLEL_IMPORTS_WORKERS", DEFAULT_PARALLEL_WORKERS))
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import")
+
+    def import_module(self, module_name: str, lazy: bool = None, depends_on=()):
+        """
+        Import a module, recording the time taken.
+
+        In parallel mode the import starts immediately on the thread pool, once every module in depends_on has
+        been imported, and a stand-in is returned that waits for it on first attribute access.
+        """
+        if self.parallel:
+            self._futures[module_name] = self._executor.submit(
+                self._call_after, depends_on, self._timed_import, module_name
+            )
+            return LazyModule(self, module_name, depends_on)
+        if lazy is None:
+            lazy = self.lazy
+        if lazy:
+            return LazyModule(self, module_name, depends_on)
+        return self._timed_import(module_name)
+
+    def submit(self, label: str, fn, *args, depends_on=()) -> Future:
+        """
+        Run fn on the thread pool in parallel mode (or immediately otherwise), recording it under label
+        """
+        if self._executor is None:
+            future = Future()
+            future.set_result(self._timed_call(label, fn, *args))
+            return future
+        return self._executor.submit(self._call_after, depends_on, self._timed_call, label, fn, *args)
+
+    def wait(self):
+        """
+        Wait for all parallel imports and tasks, so that they complete within the init phase
+        """
+        for future in list(self._futures.values()):
+            future.result()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def start_invoke(self):
+        """
+        Mark the end of the init phase. Any lazy import resolved from here on is attributed to the invoke phase.
+        """
+        self.phase = PHASE_INVOKE
+        self.invocations += 1
+
+    def phase_totals(self):
+        totals = {PHASE_INIT: 0, PHASE_INVOKE: 0}
+        for module_name, phase in self.phases.items():
+            totals[phase] += self.timings[module_name]
+        return totals
+
+    def _resolve(self, module_name: str):
+        future = self._futures.get(module_name)
+        if future is not None:
+            return future.result()
+        return self._timed_import(module_name)
+
+    def _call_after(self, depends_on, fn, *args):
+        # Dependencies were submitted earlier, so with a FIFO pool they are already running or done
+        for dependency in depends_on:
+            if isinstance(dependency, LazyModule):
+                dependency._load()
+            elif isinstance(dependency, Future):
+                dependency.result()
+        return fn(*args)
+
+    def _timed_import(self, module_name: str):
+        mod = self._timed_call(module_name, importlib.import_module, module_name)
+        self.timings[module_name] = self.threads[module_name]["wall_us"]
+        self.phases[module_name] = self.phase
+        return mod
 
-    def import_module(self, module_name: str):
+    def _timed_call(self, label: str, fn, *args):
         timer = Timer()
+        probe = MemoryProbe() if self.track_memory else None
+        start_offset_us = (time.monotonic_ns() - self._start_ns) / 1000
+        cpu_start_ns = time.thread_time_ns()
+        if probe is not None:
+            probe.start()
         with timer:
-            mod = __import__(module_name)
-        self.timings[module_name] = timer.elapsed_us
-        return mod
\ No newline at end of file
+            result = fn(*args)
+        if probe is not None:
+            # Process-wide, so in parallel mode this includes whatever ran concurrently
+            self.memory[label] = probe.stop()
+        # Per-thread wall and CPU time show how much the parallel work really overlapped
+        self.threads[label] = {
+            "thread": threading.current_thread().name,
+            "start_us": start_offset_us,
+            "wall_us": timer.elapsed_us,
+            "cpu_us": (time.thread_time_ns() - cpu_start_ns) / 1000,
+        }
+        return result
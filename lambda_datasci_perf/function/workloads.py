@@ -0,0 +1,194 @@
+"""
+Data workloads selectable from the event with {"workload": <name>}, each sized by num_rows. Workloads that write
+Parquet use the options the handler built from PARQUET_* and the event's "parquet" object.
+
+Inputs that must already be in S3 (for read and csv_to_parquet) are generated on first use and cached under
+INPUT_PREFIX, keyed by size and seed, so later invocations time only the workload itself.
+"""
+
+import math
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+import datagen
+import parquet_writer
+import phases
+from streaming import S3RangeReader
+
+INPUT_PREFIX = 'inputs'
+DEFAULT_INPUT_SEED = 0
+DEFAULT_ROW_GROUPS = 10
+DEFAULT_READ_COLUMNS = ['Order ID', 'Product Category', 'Unit Price']
+DEFAULT_SELECTIVITY = 0.1
+DEFAULT_RETURN_RATE = 0.1
+CATEGORY_MARGINS = {'Electronics': 0.15, 'Clothing': 0.4, 'Home & Kitchen': 0.3, 'Sports': 0.25, 'Toys': 0.35}
+CSV_COLUMN_TYPES = {
+    'Order ID': pa.int64(),
+    'Product Category': pa.dictionary(pa.int32(), pa.string()),
+    'Quantity Sold': pa.int64(),
+    'Unit Price': pa.float64(),
+    'Purchase Date': pa.date32(),
+}
+NOT_FOUND_ERROR_CODES = ('404', 'NoSuchKey', 'NotFound')
+
+WORKLOADS = {}
+
+
+def workload(name: str):
+    # The dashboard has a widget for each declared phase, so undeclared workloads would go unplotted
+    if name not in phases.WORKLOAD_PHASES:
+        raise ValueError(f"Workload {name!r} has no phases declared in phases.WORKLOAD_PHASES")
+
+    def register(fn):
+        WORKLOADS[name] = fn
+        return fn
+    return register
+
+
+def _error_code(error):
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+
+def ensure_input(s3_client, bucket: str, key: str, build) -> int:
+    """
+    Upload the bytes returned by build() to key unless the object already exists. Returns the object's size.
+    """
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+    except Exception as error:
+        if _error_code(error) not in NOT_FOUND_ERROR_CODES:
+            raise
+    data = build()
+    s3_client.put_object(Bucket=bucket, Key=key, Body=data)
+    return len(data)
+
+
+def _input_orders(num_rows: int, seed: int) -> pd.DataFrame:
+    return datagen.generate_orders(num_rows, datagen.make_rng(seed))
+
+
+def _orders_parquet(num_rows: int, seed: int, row_groups: int) -> bytes:
+    buf = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(_input_orders(num_rows, seed), preserve_index=False)
+    pq.write_table(table, buf, row_group_size=math.ceil(num_rows / row_groups))
+    return buf.getvalue().to_pybytes()
+
+
+@workload('read')
+def read_orders(s3_client, bucket, key, num_rows, rng, event, spans, options) -> dict:
+    """
+    Read an orders Parquet object with column projection and a predicate on Order ID.
+
+    The input is sorted by Order ID, so row groups outside the predicate are skipped using their statistics,
+    and only the footer and the projected column chunks of the remaining row groups are fetched from S3.
+    """
+    seed = int(event.get('seed', DEFAULT_INPUT_SEED))
+    row_groups = int(event.get('row_groups', DEFAULT_ROW_GROUPS))
+    input_key = f'{INPUT_PREFIX}/orders_{num_rows}_{seed}_{row_groups}.parquet'
+    with spans.span('prepare'):
+        size = ensure_input(s3_client, bucket, input_key, lambda: _orders_parquet(num_rows, seed, row_groups))
+
+    max_order_id = int(num_rows * float(event.get('selectivity', DEFAULT_SELECTIVITY)))
+    with spans.span('read_parquet'):
+        source = S3RangeReader(s3_client, bucket, input_key, size)
+        table = pq.read_table(source, columns=event.get('columns', DEFAULT_READ_COLUMNS),
+                              filters=[('Order ID', '<=', max_order_id)])
+    with spans.span('to_pandas'):
+        df = table.to_pandas()
+    return {
+        'workload': 'read',
+        'input_key': input_key,
+        'num_rows': num_rows,
+        'rows_read': len(df),
+        'columns': list(df.columns),
+        'object_size': size,
+        'bytes_read': source.bytes_read,
+        'requests': source.requests,
+    }
+
+
+@workload('groupby')
+def groupby_orders(s3_client, bucket, key, num_rows, rng, event, spans, options) -> dict:
+    """
+    Monthly orders, quantity, revenue and mean unit price per product category
+    """
+    with spans.span('generate'):
+        df = datagen.generate_orders(num_rows, rng)
+    with spans.span('groupby'):
+        df = df.assign(
+            Revenue=df['Quantity Sold'] * df['Unit Price'],
+            Month=df['Purchase Date'].astype('datetime64[s]').dt.to_period('M'),
+        )
+        summary = df.groupby(['Product Category', 'Month'], observed=True).agg(
+            orders=('Order ID', 'size'),
+            quantity=('Quantity Sold', 'sum'),
+            revenue=('Revenue', 'sum'),
+            mean_unit_price=('Unit Price', 'mean'),
+        )
+    return {'workload': 'groupby', 'num_rows': num_rows, 'groups': len(summary)}
+
+
+@workload('csv_to_parquet')
+def csv_to_parquet(s3_client, bucket, key, num_rows, rng, event, spans, options) -> dict:
+    """
+    Download an orders CSV from S3, parse it with explicit column types and upload it as Parquet, written with the
+    handler's validated writer options
+    """
+    seed = int(event.get('seed', DEFAULT_INPUT_SEED))
+    input_key = f'{INPUT_PREFIX}/orders_{num_rows}_{seed}.csv'
+    with spans.span('prepare'):
+        ensure_input(s3_client, bucket, input_key,
+                     lambda: _input_orders(num_rows, seed).to_csv(index=False).encode())
+
+    with spans.span('download'):
+        data = s3_client.get_object(Bucket=bucket, Key=input_key)['Body'].read()
+    with spans.span('parse_csv'):
+        table = pacsv.read_csv(pa.BufferReader(data),
+                               convert_options=pacsv.ConvertOptions(column_types=CSV_COLUMN_TYPES))
+    with spans.span('write_parquet'):
+        buf = pa.BufferOutputStream()
+        parquet_writer.write_table(table, buf, options)
+        parquet_data = buf.getvalue()
+    with spans.span('upload'):
+        response = s3_client.put_object(Bucket=bucket, Key=key, Body=pa.BufferReader(parquet_data),
+                                        ContentLength=parquet_data.size)
+    return {
+        'workload': 'csv_to_parquet',
+        'input_key': input_key,
+        'num_rows': table.num_rows,
+        'csv_size': len(data),
+        'bucket': bucket,
+        'key': key,
+        'size': parquet_data.size,
+        'etag': response['ETag'],
+    }
+
+
+@workload('join')
+def join_orders(s3_client, bucket, key, num_rows, rng, event, spans, options) -> dict:
+    """
+    Join orders with a returns table on Order ID and a category margin table, then total profit per category
+    """
+    return_rate = float(event.get('return_rate', DEFAULT_RETURN_RATE))
+    with spans.span('generate'):
+        orders = datagen.generate_orders(num_rows, rng)
+        returned_ids = rng.choice(orders['Order ID'].values, size=int(num_rows * return_rate), replace=False)
+        returns = pd.DataFrame({
+            'Order ID': returned_ids,
+            'Quantity Returned': rng.integers(1, 3, size=len(returned_ids)),
+        })
+        margins = pd.DataFrame({
+            'Product Category': pd.Categorical(list(CATEGORY_MARGINS), categories=datagen.PRODUCT_CATEGORIES),
+            'Margin': list(CATEGORY_MARGINS.values()),
+        })
+    with spans.span('join'):
+        joined = (orders.merge(returns, on='Order ID', how='left')
+                  .merge(margins, on='Product Category', how='left'))
+    with spans.span('aggregate'):
+        net_quantity = (joined['Quantity Sold'] - joined['Quantity Returned'].fillna(0)).clip(lower=0)
+        profit = net_quantity * joined['Unit Price'] * joined['Margin']
+        summary = profit.groupby(joined['Product Category'], observed=True).sum()
+    return {'workload': 'join', 'num_rows': num_rows, 'returns': len(returns), 'groups': len(summary)}
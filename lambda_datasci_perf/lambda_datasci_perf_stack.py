@@ -1,5 +1,8 @@
+import functools
+import json
 from os import path
 from aws_cdk import (
+    Annotations,
     DockerImage,
     Duration,
     Stack,
@@ -11,13 +14,64 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from lambda_datasci_perf import matrix
+from lambda_datasci_perf.function import phases
+
 TIMEOUT_SECONDS = 660
-DEFAULT_FUNCTION_MEMORY = 1024
 
-MEMORY_CONFIGS = (1024, 1769, 3538, 10240)
+FUNCTION_DIR = path.join(path.dirname(__file__), "function")
+
+RUNTIMES = {
+    "Python38": lamb.Runtime.PYTHON_3_8,
+    "Python39": lamb.Runtime.PYTHON_3_9,
+    "Python310": lamb.Runtime.PYTHON_3_10,
+    "Python311": lamb.Runtime.PYTHON_3_11,
+}
+ARCHITECTURES = {
+    "x86_64": lamb.Architecture.X86_64,
+    "arm64": lamb.Architecture.ARM_64,
+}
+PLATFORMS = {
+    "x86_64": ecr_assets.Platform.LINUX_AMD64,
+    "arm64": ecr_assets.Platform.LINUX_ARM64,
+}
+
+# CloudFormation allows 500 resources per stack, and each function brings its role, policy, invoke config and
+# log retention resource
+MAX_FUNCTIONS_PER_STACK = 99
+
+# Logs Insights limit on log groups per query
+MAX_LOG_GROUPS_PER_QUERY = 50
+
+# CloudWatch limit on metrics per dashboard, and CloudFormation limit on the template size (uploaded to S3)
+MAX_DASHBOARD_METRICS = 2500
+MAX_TEMPLATE_BYTES = 1_000_000
+
+# Matrix config key -> context key overriding it, e.g. -c memorySizes=1024,1769
+MATRIX_CONTEXT_KEYS = {
+    "runtimes": "runtimes",
+    "architectures": "architectures",
+    "packaging": "packaging",
+    "memory_sizes": "memorySizes",
+    "variants": "variants",
+}
 
 POWERTOOLS_METRICS_NAMESPACE = "LambdaDatasciPerfStack"
 
+
+def shaken_asset_context_key(runtime_label: str, architecture: str) -> str:
+    """
+    Context key for the tree-shaken asset of a runtime and architecture, e.g. -c shakenAssetPython39=./shaken or
+    -c shakenAssetPython39Arm64=./shaken-arm64
+    """
+    suffix = "" if architecture == matrix.DEFAULT_ARCHITECTURE else architecture.capitalize()
+    return f"shakenAsset{runtime_label}{suffix}"
+
+
+def chunked(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 class LambdaDatasciPerfStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -36,34 +90,20 @@ class LambdaDatasciPerfStack(Stack):
 
         self.bucket = s3.Bucket(self, "bucket")
 
-        self.runtimes = {
-            # "Python38": {
-            #     "Runtime": lamb.Runtime.PYTHON_3_8,
-            #     "SDKForPandasLayer": f"arn:aws:lambda:{self.region}:336392948345:layer:AWSSDKPandas-Python38:11",
-            #     "PowertoolsLayer": f"arn:aws:lambda:{self.region}:017000801446:layer:AWSLambdaPowertoolsPythonV2:46",
-            #     "ImageVersion": "3.8"
-            # },
-            "Python39": {
-                "Runtime": lamb.Runtime.PYTHON_3_9,
-                "SDKForPandasLayer": f"arn:aws:lambda:{self.region}:336392948345:layer:AWSSDKPandas-Python39:11",
-                "PowertoolsLayer": f"arn:aws:lambda:{self.region}:017000801446:layer:AWSLambdaPowertoolsPythonV2:46",
-                "ImageVersion": "3.9"
-            },
-            # "Python310": {
-            #     "Runtime": lamb.Runtime.PYTHON_3_10,
-            #     "SDKForPandasLayer": f"arn:aws:lambda:{self.region}:336392948345:layer:AWSSDKPandas-Python310:6",
-            #     "PowertoolsLayer": f"arn:aws:lambda:{self.region}:017000801446:layer:AWSLambdaPowertoolsPythonV2:46",
-            #     "ImageVersion": "3.10"
-            # },
-            # "Python311": {
-            #     "Runtime": lamb.Runtime.PYTHON_3_11,
-            #     "SDKForPandasLayer": f"arn:aws:lambda:{self.region}:336392948345:layer:AWSSDKPandas-Python311:3",
-            #     "PowertoolsLayer": f"arn:aws:lambda:{self.region}:017000801446:layer:AWSLambdaPowertoolsPythonV2:46",
-            #     "ImageVersion": "3.11"
-            # },
-        }
+        # Which functions to deploy (see matrix.py). The default matrix is experiment_matrix.json, replaced with
+        # -c matrixConfig=path, with single dimensions overridden by context, e.g. -c architectures=x86_64,arm64 -c runtimes=Python311
+        self.function_specs = matrix.expand(matrix.apply_overrides(
+            matrix.load_matrix(self.node.try_get_context("matrixConfig") or matrix.DEFAULT_MATRIX_PATH),
+            {key: self.node.try_get_context(context_key) for key, context_key in MATRIX_CONTEXT_KEYS.items()},
+        ))
 
         functions_by_name = self.create_lambda_functions()
+        if len(functions_by_name) > MAX_FUNCTIONS_PER_STACK:
+            raise ValueError(
+                f"The experiment matrix has {len(functions_by_name)} functions, more than the "
+                f"{MAX_FUNCTIONS_PER_STACK} that fit in one stack. Deploy it in slices with a stack each, "
+                f"e.g. -c stackName=LambdaDatasciPerfStackArm64 -c architectures=arm64"
+            )
 
         self.create_dashboard(functions_by_name)
 
@@ -72,90 +112,64 @@ class LambdaDatasciPerfStack(Stack):
             "BUCKET_NAME": self.bucket.bucket_name,
             "POWERTOOLS_METRICS_NAMESPACE": POWERTOOLS_METRICS_NAMESPACE
         }
+        if self.node.try_get_context("lazyImports"):
+            # Defer heavy imports until first attribute access (see timed_import.LazyModule)
+            common_envs["LAZY_IMPORTS"] = "true"
+        if self.node.try_get_context("parallelImports"):
+            # Run independent imports and S3 client creation on a thread pool during init
+            common_envs["PARALLEL_IMPORTS"] = "true"
+        if self.node.try_get_context("backgroundUpload"):
+            # Upload on a persistent executor while the response, logs and metrics are produced
+            common_envs["BACKGROUND_UPLOAD"] = "true"
+        parquet_options = self.node.try_get_context("parquetOptions")
+        if parquet_options:
+            # Parquet writer defaults (see function/parquet_options.py), e.g. -c parquetOptions='{"compression": "zstd"}'
+            if isinstance(parquet_options, str):
+                parquet_options = json.loads(parquet_options)
+            for name, value in parquet_options.items():
+                if isinstance(value, list):
+                    value = ",".join(value)
+                common_envs[f"PARQUET_{name.upper()}"] = str(value).lower() if isinstance(value, bool) else str(value)
 
         common_function_kwargs = dict(
             timeout=Duration.seconds(TIMEOUT_SECONDS),
             retry_attempts=0,
-            memory_size=DEFAULT_FUNCTION_MEMORY,
-            architecture=lamb.Architecture.X86_64,
             tracing=lamb.Tracing.ACTIVE,
         )
 
         functions_by_name: dict[str, lamb.Function] = {}
-        for (runtime_label, runtime_props) in self.runtimes.items():
-            runtime = runtime_props["Runtime"]
-            asset_code = lamb.Code.from_asset(
-                path.join(path.dirname(__file__), "function"),
-                bundling={
-                    # We explicitly set the right architecture version of the image because
-                    # runtime.bundling_image is not arch-specific and may result in arm64 .so's being deployed
-                    # to x86_64 lambda functions
-                    "image": DockerImage.from_registry(f"public.ecr.aws/sam/build-{runtime.name}:latest-x86_64"),
-                    "platform": ecr_assets.Platform.LINUX_AMD64.platform,
-                    "command": [
-                        "bash",
-                        "-c",
-                        "pip install -r requirements-lambda.txt -t /asset-output && " 
-                            "find /asset-output -type f -name \"*.so\" -exec strip {} \; && "
-                            "find /asset-output -wholename \"*/tests/*\" -type f -delete && "
-                            "find /asset-output -regex '^.*\(__pycache__\|\.py[co]\)$' -delete && "
-                            "rm -rf /asset-output/boto* && "
-                            "rm -rf /asset-output/urllib3* && "
-                            "cp -au . /asset-output"
-                    ],
-                },
+        missing_shaken_assets: dict[str, list] = {}
+        for spec in self.function_specs:
+            function_kwargs = dict(
+                **common_function_kwargs,
+                memory_size=spec.memory,
+                architecture=ARCHITECTURES[spec.architecture],
+                environment={**common_envs, **spec.environment, "POWERTOOLS_SERVICE_NAME": spec.name},
+                function_name=spec.name,
             )
-            for memory_config in MEMORY_CONFIGS:
-                zip_function_name = f"perf_zip_{runtime_label}_{memory_config}"
-                functions_by_name[zip_function_name] = lamb.Function(
+            if spec.packaging == "image":
+                functions_by_name[spec.name] = lamb.DockerImageFunction(
                     self,
-                    zip_function_name,
-                    **common_function_kwargs,
-                    environment={**common_envs, "POWERTOOLS_SERVICE_NAME": zip_function_name},
-                    code=asset_code,
-                    handler="handler.handle_event",
-                    runtime=runtime,
-                    function_name=zip_function_name,
+                    spec.name,
+                    **function_kwargs,
+                    code=self.image_code(spec.runtime, spec.architecture),
                 )
+                continue
 
-            powertools_layer = lamb.LayerVersion.from_layer_version_arn(
-                self, f"perf_zip_{runtime_label}_powertools_layer",
-                layer_version_arn=runtime_props["PowertoolsLayer"]
-            )
-            sdk_for_pandas_layer = lamb.LayerVersion.from_layer_version_arn(
-                self, f"perf_zip_{runtime_label}_sdk_for_pandas_layer",
-                layer_version_arn=runtime_props["SDKForPandasLayer"]
-            )
-
-            for memory_config in MEMORY_CONFIGS:
-                zip_layers_function_name = f"perf_zip_layers_{runtime_label}_{memory_config}"
-                functions_by_name[zip_layers_function_name] = lamb.Function(
-                    self,
-                    zip_layers_function_name,
-                    **common_function_kwargs,
-                    environment={**common_envs, "POWERTOOLS_SERVICE_NAME": zip_layers_function_name},
-                    code=lamb.Code.from_asset(path.join(path.dirname(__file__), "function")),
-                    layers=[powertools_layer, sdk_for_pandas_layer],
-                    handler="handler.handle_event",
-                    runtime=runtime,
-                    function_name=zip_layers_function_name,
-                )
-            
-            image_code = lamb.DockerImageCode.from_image_asset(
-                path.dirname(__file__),
-                build_args={"PYTHON_VERSION": runtime_props["ImageVersion"]},
-                platform=ecr_assets.Platform.LINUX_AMD64
+            code = self.zip_code(spec)
+            if code is None:
+                key = shaken_asset_context_key(spec.runtime, spec.architecture)
+                missing_shaken_assets.setdefault(key, []).append(spec.name)
+                continue
+            functions_by_name[spec.name] = lamb.Function(
+                self,
+                spec.name,
+                **function_kwargs,
+                code=code,
+                layers=self.layers(spec.runtime, spec.architecture) if spec.packaging == "zip_layers" else None,
+                handler="handler.handle_event",
+                runtime=RUNTIMES[spec.runtime],
             )
-            for memory_config in MEMORY_CONFIGS:
-                image_function_name = f"perf_image_{runtime_label}_{memory_config}"
-                functions_by_name[image_function_name] = lamb.DockerImageFunction(
-                    self,
-                    image_function_name,
-                    **common_function_kwargs,
-                    environment={**common_envs, "POWERTOOLS_SERVICE_NAME": image_function_name},
-                    code=image_code,
-                    function_name=image_function_name,
-                )
 
         for func in functions_by_name.values():
             func.role.add_to_principal_policy(iam.PolicyStatement(
@@ -165,9 +179,92 @@ class LambdaDatasciPerfStack(Stack):
             ))
             self.bucket.grant_read_write(func)
 
+        for key, names in missing_shaken_assets.items():
+            # Shown by cdk synth and cdk deploy, and fails them with --strict
+            Annotations.of(self).add_warning(
+                f"{len(names)} zip_shaken functions in the experiment matrix are not deployed, because there is no "
+                f"-c {key}=<dir> asset from scripts/tree-shake.py: {', '.join(names)}"
+            )
+
         return functions_by_name
     
 
+    def zip_code(self, spec: matrix.FunctionSpec):
+        if spec.packaging == "zip_pyc":
+            # Same dependencies, shipped with bytecode compiled for the target interpreter
+            return self.zip_asset_code(spec.runtime, spec.architecture, precompile_bytecode=True)
+        if spec.packaging == "zip_shaken":
+            return self.shaken_asset_code(spec.runtime, spec.architecture)
+        if spec.packaging == "zip_layers":
+            # Only the handler; the dependencies come from the layers
+            return self.handler_code()
+        return self.zip_asset_code(spec.runtime, spec.architecture)
+
+    # Code and layers are shared by every function with the same runtime and architecture, so each asset is
+    # bundled once
+    @functools.cache
+    def zip_asset_code(self, runtime_label: str, architecture: str, precompile_bytecode: bool = False):
+        if precompile_bytecode:
+            # Unchecked-hash pycs are used without stat-ing the source, and Lambda's read-only filesystem
+            # means the runtime can never write its own cache
+            bytecode_command = "python -m compileall -q -f -j 0 --invalidation-mode unchecked-hash /asset-output"
+        else:
+            bytecode_command = "true"
+        return lamb.Code.from_asset(
+            FUNCTION_DIR,
+            bundling={
+                # We explicitly set the right architecture version of the image because
+                # runtime.bundling_image is not arch-specific and may result in arm64 .so's being deployed
+                # to x86_64 lambda functions
+                "image": DockerImage.from_registry(
+                    f"public.ecr.aws/sam/build-{RUNTIMES[runtime_label].name}:latest-{architecture}"
+                ),
+                "platform": PLATFORMS[architecture].platform,
+                "command": [
+                    "bash",
+                    "-c",
+                    "pip install -r requirements-lambda.txt -t /asset-output && "
+                        "find /asset-output -type f -name \"*.so\" -exec strip {} \\; && "
+                        "find /asset-output -wholename \"*/tests/*\" -type f -delete && "
+                        "find /asset-output -regex '^.*\\(__pycache__\\|\\.py[co]\\)$' -delete && "
+                        "rm -rf /asset-output/boto* && "
+                        "rm -rf /asset-output/urllib3* && "
+                        "cp -au . /asset-output && "
+                        "find /asset-output -regex '^.*\\(__pycache__\\|\\.py[co]\\)$' -delete && "
+                        f"{bytecode_command}"
+                ],
+            },
+        )
+
+    @functools.cache
+    def shaken_asset_code(self, runtime_label: str, architecture: str):
+        # Minimal asset produced by scripts/tree-shake.py. Without one, zip_shaken functions are skipped with a warning.
+        shaken_asset_path = self.node.try_get_context(shaken_asset_context_key(runtime_label, architecture))
+        return lamb.Code.from_asset(shaken_asset_path) if shaken_asset_path else None
+
+    @functools.cache
+    def handler_code(self):
+        return lamb.Code.from_asset(FUNCTION_DIR)
+
+    @functools.cache
+    def layers(self, runtime_label: str, architecture: str):
+        layer_arns = matrix.layer_arns(self.region, runtime_label, architecture)
+        suffix = "" if architecture == matrix.DEFAULT_ARCHITECTURE else f"_{architecture}"
+        return [
+            lamb.LayerVersion.from_layer_version_arn(
+                self, f"perf_zip_{runtime_label}{suffix}_{name}_layer", layer_version_arn=layer_arns[name]
+            )
+            for name in ("powertools", "sdk_for_pandas")
+        ]
+
+    @functools.cache
+    def image_code(self, runtime_label: str, architecture: str):
+        return lamb.DockerImageCode.from_image_asset(
+            path.dirname(__file__),
+            build_args={"PYTHON_VERSION": matrix.RUNTIMES[runtime_label]["version"]},
+            platform=PLATFORMS[architecture],
+        )
+
     def create_dashboard(self, functions_by_name):
         dash = cloudwatch.Dashboard(
             self, "LambdaDatasciPerfDashboard", 
@@ -185,6 +282,28 @@ class LambdaDatasciPerfStack(Stack):
                 metrics=[functions_by_name[function_name].metric_duration(statistic=stat, label=function_name) for function_name in sorted(functions_by_name.keys())]
             ))
 
+        # One widget per phase, with a SEARCH over the service dimension rather than one metric per function, so the
+        # dashboard stays within its metric and size limits for any matrix that fits in the stack. It shows every
+        # function in the namespace that recorded the phase, including those of other stack slices.
+        for phase in phases.phase_names():
+            dash.add_widgets(cloudwatch.GraphWidget(
+                title=f"Handler phase {phase} (µs)",
+                view=cloudwatch.GraphWidgetView.BAR,
+                set_period_to_time_range=True,
+                width=24,
+                height=6,
+                left=[
+                    cloudwatch.MathExpression(
+                        expression=f"SEARCH('{{{POWERTOOLS_METRICS_NAMESPACE},service}} "
+                                   f"MetricName=\"phase_{phase}\"', '{stat}')",
+                        using_metrics={},
+                        # A dynamic label, so each function's series is named after it
+                        label=f"${{PROP('Dim.service')}} {stat}",
+                    )
+                    for stat in ("p50", "p99")
+                ],
+            ))
+
         dash.add_widgets(cloudwatch.SingleValueWidget(
             title="Cold Start Counts",
             set_period_to_time_range=True,
@@ -220,44 +339,60 @@ class LambdaDatasciPerfStack(Stack):
             ]
         ))
 
+        # A Logs Insights query can read from at most MAX_LOG_GROUPS_PER_QUERY log groups
+        log_group_chunks = [
+            [functions_by_name[name].log_group.log_group_name for name in chunk]
+            for chunk in chunked(sorted(functions_by_name), MAX_LOG_GROUPS_PER_QUERY)
+        ]
         for stat_label, query in (
             ("p99", "pct(@initDuration, 99) as p99_init_duration"),
             ("max", "max(@initDuration) as max_init_duration"),
             ("avg", "avg(@initDuration) as avg_init_duration"),
             ("min", "min(@initDuration) as min_init_duration")
         ):
-            dash.add_widgets(cloudwatch.LogQueryWidget(
-                title=f"Cold Start Durations {stat_label}",
-                log_group_names=[f.log_group.log_group_name for f in functions_by_name.values()],
-                width=24,
-                height=6,
-                query_lines=[
-                    "filter @type='REPORT'",
-                    "parse @log '/aws/lambda/*' as function_name",
-                    f"stats {query} by function_name",
-                    "sort function_name asc"
-                ],
-                view=cloudwatch.LogQueryVisualizationType.BAR
-            ))
+            for index, log_group_names in enumerate(log_group_chunks):
+                part = f" ({index + 1}/{len(log_group_chunks)})" if len(log_group_chunks) > 1 else ""
+                dash.add_widgets(cloudwatch.LogQueryWidget(
+                    title=f"Cold Start Durations {stat_label}{part}",
+                    log_group_names=log_group_names,
+                    width=24,
+                    height=6,
+                    query_lines=[
+                        "filter @type='REPORT'",
+                        "parse @log '/aws/lambda/*' as function_name",
+                        f"stats {query} by function_name",
+                        "sort function_name asc"
+                    ],
+                    view=cloudwatch.LogQueryVisualizationType.BAR
+                ))
 
-            dash.add_widgets(cloudwatch.LogQueryWidget(
-                title=f"Module load times",
-                log_group_names=[f.log_group.log_group_name for f in functions_by_name.values()],
-                width=24,
-                height=24,
-                query_string="""
+        # One module load table per runtime and architecture, since import times are only comparable within one
+        function_names_by_group = {}
+        for spec in self.function_specs:
+            if spec.name in functions_by_name:
+                function_names_by_group.setdefault((spec.runtime, spec.architecture), []).append(spec.name)
+        for (runtime_label, architecture), function_names in function_names_by_group.items():
+            architecture_suffix = "" if architecture == matrix.DEFAULT_ARCHITECTURE else f"_{architecture}"
+            for log_group_names in chunked(sorted(function_names), MAX_LOG_GROUPS_PER_QUERY):
+                # Imports that are deferred (LAZY_IMPORTS) or skipped (ARROW_NATIVE) have no timing, and a missing
+                # term would make the whole total null
+                dash.add_widgets(cloudwatch.LogQueryWidget(
+                    title=f"Module load times {runtime_label} {architecture}",
+                    log_group_names=[functions_by_name[name].log_group.log_group_name for name in log_group_names],
+                    width=24,
+                    height=24,
+                    query_string=f"""
 fields @timestamp, @message, @logStream, @log
 | filter ispresent(timings.boto3)
 | parse @log '/aws/lambda/*' as function_name
-| filter function_name like 'Python39'
-| parse function_name '_*_Python39_*' as pkg_method, mem_cfg
+| filter function_name like /_{runtime_label}{architecture_suffix}_\\d+$/
+| parse function_name /^perf_(?<pkg_method>.+)_{runtime_label}{architecture_suffix}_(?<mem_cfg>\\d+)$/
 | stats
 pct(timings.powertools_init_time, 95) / 1000 as powertools_init,
 pct(timings.boto3_init_time, 95) / 1000  as boto3_init,
 pct(timings.aws_lambda_powertools, 95) / 1000  as powertools,
 pct(timings.base64, 95) / 1000  as base64,
 pct(timings.boto3, 95) / 1000  as boto3,
-pct(timings.datetime, 95) / 1000  as datetime,
 pct(timings.json, 95) / 1000  as json,
 pct(timings.numpy, 95) / 1000  as numpy,
 pct(timings.os, 95) / 1000  as os,
@@ -265,7 +400,8 @@ pct(timings.pandas, 95) / 1000  as pandas,
 pct(timings.pyarrow, 95) / 1000  as pyarrow,
 pct(timings.pyarrow.parquet, 95) / 1000  as parquet,
 pct(timings.sys, 95) / 1000  as sys
-, (powertools_init + boto3_init + powertools + base64 + boto3 + datetime + json + numpy + os + pandas + pyarrow + parquet + sys) / 1000 as total_s
+, (coalesce(powertools_init, 0) + coalesce(boto3_init, 0) + coalesce(powertools, 0) + coalesce(base64, 0) + coalesce(boto3, 0) + coalesce(json, 0)
++ coalesce(numpy, 0) + coalesce(os, 0) + coalesce(pandas, 0) + coalesce(pyarrow, 0) + coalesce(parquet, 0) + coalesce(sys, 0)) / 1000 as total_s
 by
 pkg_method, mem_cfg, 
 bin(1h) as hour
@@ -281,8 +417,8 @@ floor(boto3_init) as boto3_init_ms,
 total_s
 | sort pkg_method asc, mem_cfg asc, hour asc
 """,
-                view=cloudwatch.LogQueryVisualizationType.TABLE
-            ))
+                    view=cloudwatch.LogQueryVisualizationType.TABLE
+                ))
 
 
         dash.add_widgets(cloudwatch.SingleValueWidget(
@@ -0,0 +1,177 @@
+"""
+The experiment matrix: which perf_ functions the stack deploys, as a declarative config.
+
+A config lists the runtimes, architectures, packaging methods and memory sizes to deploy, plus named
+variants that set extra environment variables (e.g. ARROW_NATIVE). Every combination becomes one function,
+named perf_{packaging}[_{variant}]_{runtime}[_arm64]_{memory}. x86_64 functions keep the names used before
+architectures were configurable, so earlier captures still line up.
+
+A variant may restrict any dimension to a subset, e.g. {"packaging": ["zip", "image"]}, and "exclude" lists
+partial combinations to skip, e.g. {"packaging": "zip_layers", "architecture": "arm64"}.
+
+This module has no CDK dependency, so the analysis code and scripts can share the naming.
+"""
+
+import itertools
+import json
+import os
+import re
+from typing import NamedTuple
+
+DEFAULT_MATRIX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "experiment_matrix.json")
+
+DEFAULT_ARCHITECTURE = "x86_64"
+ARCHITECTURES = ("x86_64", "arm64")
+PACKAGING_METHODS = ("zip", "zip_pyc", "zip_shaken", "zip_layers", "image")
+DEFAULT_VARIANT = "default"
+
+# Python version and pinned layer versions for each runtime label. The layer versions are the same for both
+# architectures, which are published as separate layers.
+RUNTIMES = {
+    "Python38": {"version": "3.8", "sdk_for_pandas_layer_version": 11, "powertools_layer_version": 46},
+    "Python39": {"version": "3.9", "sdk_for_pandas_layer_version": 11, "powertools_layer_version": 46},
+    "Python310": {"version": "3.10", "sdk_for_pandas_layer_version": 6, "powertools_layer_version": 46},
+    "Python311": {"version": "3.11", "sdk_for_pandas_layer_version": 3, "powertools_layer_version": 46},
+}
+
+SDK_FOR_PANDAS_LAYER_ARN = "arn:aws:lambda:{region}:336392948345:layer:AWSSDKPandas-{runtime}{suffix}:{version}"
+POWERTOOLS_LAYER_ARN = "arn:aws:lambda:{region}:017000801446:layer:AWSLambdaPowertoolsPythonV2{suffix}:{version}"
+LAYER_ARCHITECTURE_SUFFIXES = {"x86_64": "", "arm64": "-Arm64"}
+
+FUNCTION_NAME_PATTERN = (
+    r"^perf_(?P<method>.+?)_(?P<runtime>Python\d+)(?:_(?P<architecture>arm64|x86_64))?_(?P<memory>\d+)$"
+)
+
+DIMENSIONS = {
+    "runtime": "runtimes",
+    "architecture": "architectures",
+    "packaging": "packaging",
+    "memory": "memory_sizes",
+}
+
+
+class FunctionSpec(NamedTuple):
+    name: str
+    runtime: str
+    architecture: str
+    packaging: str
+    variant: str
+    memory: int
+    environment: dict
+
+    @property
+    def method(self) -> str:
+        # The method part of the function name, as parsed by FUNCTION_NAME_PATTERN
+        return self.packaging if self.variant == DEFAULT_VARIANT else f"{self.packaging}_{self.variant}"
+
+
+def function_name(packaging: str, variant: str, runtime: str, architecture: str, memory: int) -> str:
+    method = packaging if variant == DEFAULT_VARIANT else f"{packaging}_{variant}"
+    architecture_part = "" if architecture == DEFAULT_ARCHITECTURE else f"_{architecture}"
+    return f"perf_{method}_{runtime}{architecture_part}_{memory}"
+
+
+def parse_function_name(name: str) -> dict:
+    """
+    method, runtime, architecture and memory of a perf_ function name, or None if it is not one
+    """
+    match = re.match(FUNCTION_NAME_PATTERN, name)
+    if match is None:
+        return None
+    return {**match.groupdict(), "architecture": match["architecture"] or DEFAULT_ARCHITECTURE,
+            "memory": int(match["memory"])}
+
+
+def layer_arns(region: str, runtime: str, architecture: str) -> dict:
+    props = RUNTIMES[runtime]
+    suffix = LAYER_ARCHITECTURE_SUFFIXES[architecture]
+    return {
+        "powertools": POWERTOOLS_LAYER_ARN.format(region=region, suffix=suffix,
+                                                  version=props["powertools_layer_version"]),
+        "sdk_for_pandas": SDK_FOR_PANDAS_LAYER_ARN.format(region=region, runtime=runtime, suffix=suffix,
+                                                          version=props["sdk_for_pandas_layer_version"]),
+    }
+
+
+def load_matrix(path: str = DEFAULT_MATRIX_PATH) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _as_list(value, convert=str) -> list:
+    # Context values given on the command line are comma-separated strings
+    if isinstance(value, str):
+        value = [item.strip() for item in value.split(",") if item.strip()]
+    return [convert(item) for item in value]
+
+
+def apply_overrides(matrix: dict, overrides: dict) -> dict:
+    """
+    Replace whole dimensions of the matrix, e.g. {"architectures": "x86_64,arm64"}. "variants" selects
+    variants by name.
+    """
+    matrix = dict(matrix)
+    for key in DIMENSIONS.values():
+        if overrides.get(key) is not None:
+            matrix[key] = _as_list(overrides[key], int if key == "memory_sizes" else str)
+    if overrides.get("variants") is not None:
+        names = _as_list(overrides["variants"])
+        unknown = set(names) - set(matrix.get("variants", {DEFAULT_VARIANT: {}}))
+        if unknown:
+            raise ValueError(f"Unknown variants: {', '.join(sorted(unknown))}")
+        matrix["variants"] = {name: matrix["variants"][name] for name in names}
+    return matrix
+
+
+def validate(matrix: dict) -> dict:
+    known = {"runtimes": RUNTIMES, "architectures": ARCHITECTURES, "packaging": PACKAGING_METHODS}
+    for key, values in known.items():
+        unknown = set(matrix.get(key, ())) - set(values)
+        if unknown:
+            raise ValueError(f"Unknown {key}: {', '.join(sorted(unknown))}, expected: {', '.join(values)}")
+    for memory in matrix.get("memory_sizes", ()):
+        if not 128 <= memory <= 10240:
+            raise ValueError(f"Memory sizes must be between 128 and 10240 MB, got {memory}")
+    for name in matrix.get("variants", {}):
+        if not re.fullmatch(r"[a-z0-9]+", name):
+            raise ValueError(f"Variant names must be lowercase letters and digits, got {name!r}")
+    return matrix
+
+
+def _matches(values: dict, selector: dict) -> bool:
+    # A selector value may be a single value or a list of values
+    for dimension, allowed in selector.items():
+        if dimension not in DIMENSIONS:
+            continue
+        allowed = allowed if isinstance(allowed, list) else [allowed]
+        if values[dimension] not in allowed:
+            return False
+    return True
+
+
+def expand(matrix: dict) -> list:
+    """
+    Every function in the matrix, in a stable order
+    """
+    validate(matrix)
+    variants = matrix.get("variants") or {DEFAULT_VARIANT: {}}
+    specs = []
+    for variant, variant_props in variants.items():
+        restrictions = {dimension: variant_props[key] for dimension, key in DIMENSIONS.items()
+                        if key in variant_props}
+        for runtime, architecture, packaging, memory in itertools.product(
+                matrix["runtimes"], matrix["architectures"], matrix["packaging"], matrix["memory_sizes"]):
+            values = {"runtime": runtime, "architecture": architecture, "packaging": packaging, "memory": memory}
+            if not _matches(values, restrictions) or any(
+                    _matches(values, excluded) for excluded in matrix.get("exclude", ())):
+                continue
+            specs.append(FunctionSpec(
+                name=function_name(packaging, variant, runtime, architecture, memory),
+                runtime=runtime,
+                architecture=architecture,
+                packaging=packaging,
+                variant=variant,
+                memory=memory,
+                environment=dict(variant_props.get("environment", {})),
+            ))
+    return specs
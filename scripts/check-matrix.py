@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Synthesize the stack for an experiment matrix and check the template against it, without Docker or AWS access.
+
+Asset bundling is skipped, so this runs anywhere aws-cdk-lib and Node.js are installed. The expanded matrix is
+printed, then CDK assertions check that every function in it exists with the memory size, architecture, runtime,
+layers and environment it specifies, that no other perf_ functions do, that zip_shaken functions without an
+asset are named in a warning, and that the dashboard has a module load widget for each runtime and architecture
+and a widget for each handler and workload phase. Finally it checks the template size and the number of metrics
+on the dashboard against the CloudFormation and CloudWatch limits. Context is given as for cdk synth.
+
+Usage:
+    ./scripts/check-matrix.py
+    ./scripts/check-matrix.py -c architectures=x86_64,arm64 -c runtimes=Python39,Python311
+    ./scripts/check-matrix.py -c matrixConfig=my-matrix.json -c shakenAssetPython39=./shaken
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import aws_cdk as cdk  # noqa: E402
+from aws_cdk.assertions import Annotations, Match, Template  # noqa: E402
+
+from lambda_datasci_perf import matrix  # noqa: E402
+from lambda_datasci_perf.function import phases  # noqa: E402
+from lambda_datasci_perf.lambda_datasci_perf_stack import (  # noqa: E402
+    MATRIX_CONTEXT_KEYS,
+    MAX_DASHBOARD_METRICS,
+    MAX_TEMPLATE_BYTES,
+    LambdaDatasciPerfStack,
+    shaken_asset_context_key,
+)
+
+ACCOUNT = "123456789012"
+
+
+def parse_context(values) -> dict:
+    context = {}
+    for value in values:
+        key, separator, item = value.partition("=")
+        if not separator:
+            raise SystemExit(f"Context must be key=value, got {value!r}")
+        context[key] = item
+    return context
+
+
+def expected_specs(context: dict) -> list:
+    specs = matrix.expand(matrix.apply_overrides(
+        matrix.load_matrix(context.get("matrixConfig") or matrix.DEFAULT_MATRIX_PATH),
+        {key: context.get(context_key) for key, context_key in MATRIX_CONTEXT_KEYS.items()},
+    ))
+    return [
+        spec for spec in specs
+        if spec.packaging != "zip_shaken" or shaken_asset_context_key(spec.runtime, spec.architecture) in context
+    ]
+
+
+def synthesize(context: dict, region: str) -> LambdaDatasciPerfStack:
+    app = cdk.App(context={**context, "aws:cdk:bundling-stacks": []})
+    return LambdaDatasciPerfStack(app, "LambdaDatasciPerfStack", env=cdk.Environment(account=ACCOUNT, region=region))
+
+
+def check_functions(template: Template, specs: list, region: str):
+    functions = template.find_resources("AWS::Lambda::Function")
+    deployed = {
+        resource["Properties"]["FunctionName"] for resource in functions.values()
+        if str(resource["Properties"].get("FunctionName", "")).startswith("perf_")
+    }
+    expected = {spec.name for spec in specs}
+    if deployed != expected:
+        raise AssertionError(f"Missing functions: {sorted(expected - deployed)}, "
+                             f"unexpected functions: {sorted(deployed - expected)}")
+
+    for spec in specs:
+        properties = {
+            "FunctionName": spec.name,
+            "MemorySize": spec.memory,
+            "Architectures": [spec.architecture],
+            "Environment": {"Variables": Match.object_like({**spec.environment, "POWERTOOLS_SERVICE_NAME": spec.name})},
+        }
+        if spec.packaging == "image":
+            properties["PackageType"] = "Image"
+        else:
+            properties["Runtime"] = f"python{matrix.RUNTIMES[spec.runtime]['version']}"
+            layer_arns = matrix.layer_arns(region, spec.runtime, spec.architecture)
+            properties["Layers"] = (
+                [layer_arns["powertools"], layer_arns["sdk_for_pandas"]] if spec.packaging == "zip_layers"
+                else Match.absent()
+            )
+        template.has_resource_properties("AWS::Lambda::Function", properties)
+
+
+def check_skipped(stack: LambdaDatasciPerfStack, specs: list):
+    # Every zip_shaken function left out for lack of an asset must be named in a warning
+    annotations = Annotations.from_stack(stack)
+    deployed = {spec.name for spec in specs}
+    for spec in stack.function_specs:
+        if spec.name not in deployed:
+            annotations.has_warning("*", Match.string_like_regexp(f"{spec.name}(,|$)"))
+
+
+def dashboard_body(resource: dict) -> dict:
+    # The body is an Fn::Join of strings and references, which are replaced with a placeholder to parse it
+    parts = resource["Properties"]["DashboardBody"]["Fn::Join"][1]
+    return json.loads("".join(part if isinstance(part, str) else "ref" for part in parts))
+
+
+def check_limits(template: Template):
+    size = len(json.dumps(template.to_json()))
+    if size > MAX_TEMPLATE_BYTES:
+        raise AssertionError(f"The template is {size} bytes, more than the {MAX_TEMPLATE_BYTES} CloudFormation allows")
+    for name, resource in template.find_resources("AWS::CloudWatch::Dashboard").items():
+        metrics = sum(len(widget["properties"].get("metrics", ())) for widget in dashboard_body(resource)["widgets"])
+        if metrics > MAX_DASHBOARD_METRICS:
+            raise AssertionError(f"Dashboard {name} has {metrics} metrics, more than the {MAX_DASHBOARD_METRICS} "
+                                 f"CloudWatch allows")
+    return size
+
+
+def check_dashboard(template: Template, specs: list):
+    dashboards = template.find_resources("AWS::CloudWatch::Dashboard")
+    body = json.dumps([resource["Properties"]["DashboardBody"] for resource in dashboards.values()])
+    for runtime, architecture in {(spec.runtime, spec.architecture) for spec in specs}:
+        if f"Module load times {runtime} {architecture}" not in body:
+            raise AssertionError(f"No module load widget for {runtime} {architecture}")
+    for phase in phases.phase_names():
+        if f"Handler phase {phase} (" not in body:
+            raise AssertionError(f"No widget for phase {phase}")
+    if "Python39" not in {spec.runtime for spec in specs} and "like 'Python39'" in body:
+        raise AssertionError("The dashboard still queries Python39 functions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the synthesized stack against the experiment matrix")
+    parser.add_argument("-c", "--context", action="append", default=[], help="Context key=value, as for cdk")
+    parser.add_argument("--region", default="us-east-1", help="Region to synthesize for")
+    args = parser.parse_args()
+
+    context = parse_context(args.context)
+    specs = expected_specs(context)
+    groups = {}
+    for spec in specs:
+        groups.setdefault((spec.runtime, spec.architecture), []).append(spec.name)
+    for (runtime, architecture), names in groups.items():
+        print(f"{runtime} {architecture}: {len(names)} functions")
+        for name in names:
+            print(f"    {name}")
+
+    stack = synthesize(context, args.region)
+    template = Template.from_stack(stack)
+    check_functions(template, specs, args.region)
+    check_skipped(stack, specs)
+    check_dashboard(template, specs)
+    size = check_limits(template)
+    skipped = len(stack.function_specs) - len(specs)
+    print(f"{len(specs)} functions match the experiment matrix, {skipped} zip_shaken functions skipped with a warning")
+    print(f"The template is {size} bytes")
+
+
+if __name__ == "__main__":
+    main()
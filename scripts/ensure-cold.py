@@ -1,28 +1,139 @@
 #!/usr/bin/env python3
+"""
+Force the next invocation of each perf_ function to be a cold start.
 
-from datetime import datetime
+Changing a function's configuration retires its existing sandboxes, so each function gets a new
+COLD_START_FORCER environment variable value. Updates run concurrently, and the script waits until every
+function's LastUpdateStatus is Successful, so invocations that follow land on new sandboxes.
+
+Usage:
+    ./scripts/ensure-cold.py
+    ./scripts/ensure-cold.py --method zip zip_layers --memory 1024 --max-workers 16
+    ./scripts/ensure-cold.py --architecture arm64
+    ./scripts/ensure-cold.py --endpoint-url http://127.0.0.1:5000
+"""
+
+import argparse
+import os
+import random
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 
 import boto3
 
-def ensure_cold():
-    session = boto3.session.Session()
-    print('Using region', session.region_name)
-    lamb = session.client("lambda")
-    pag = lamb.get_paginator("list_functions")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lambda_datasci_perf import matrix  # noqa: E402
+
+RETRYABLE_ERROR_CODES = ("ResourceConflictException", "TooManyRequestsException", "ThrottlingException")
+
+
+def _error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
 
-    function_envs_by_name = {}
+def list_perf_functions(client, methods=None, runtimes=None, memory_sizes=None, architectures=None):
+    """
+    Environment variables of each perf_ function matching the filters, keyed by function name
+    """
+    functions = {}
+    for page in client.get_paginator("list_functions").paginate():
+        for function in page["Functions"]:
+            parsed = matrix.parse_function_name(function["FunctionName"])
+            if parsed is None:
+                continue
+            if ((methods and parsed["method"] not in methods) or (runtimes and parsed["runtime"] not in runtimes)
+                    or (memory_sizes and parsed["memory"] not in memory_sizes)
+                    or (architectures and parsed["architecture"] not in architectures)):
+                continue
+            functions[function["FunctionName"]] = function.get("Environment", {}).get("Variables", {})
+    return functions
 
-    for page in pag.paginate():
-        function_envs_by_name.update({f["FunctionName"]: f["Environment"]["Variables"] for f in page["Functions"] if f["FunctionName"].startswith("perf_")})
 
-    env_value = datetime.now().isoformat()
-    added_envs = {"COLD_START_FORCER": env_value}
-    for function_name, envs in function_envs_by_name.items():
-        new_envs = {**envs, **added_envs}
-        print('Updating', function_name, 'with', new_envs)
-        lamb.update_function_configuration(FunctionName=function_name, Environment={"Variables": new_envs})
+def _with_retries(call, max_attempts: int, base_delay: float):
+    for attempt in range(max_attempts):
+        try:
+            return call()
+        except Exception as error:
+            if _error_code(error) not in RETRYABLE_ERROR_CODES or attempt == max_attempts - 1:
+                raise
+            time.sleep(base_delay * 2 ** attempt * (0.5 + random.random()))
+
+
+def force_cold(client, function_name: str, variables: dict, value: str, max_attempts: int = 8,
+               base_delay: float = 0.5, poll_interval: float = 1.0, timeout: float = 300) -> float:
+    """
+    Update one function's environment and wait until the update has completed. Returns the seconds taken.
+    """
+    start = time.monotonic()
+    _with_retries(lambda: client.update_function_configuration(
+        FunctionName=function_name, Environment={"Variables": {**variables, "COLD_START_FORCER": value}}
+    ), max_attempts, base_delay)
+
+    delay = poll_interval
+    while True:
+        configuration = _with_retries(lambda: client.get_function_configuration(FunctionName=function_name),
+                                      max_attempts, base_delay)
+        status = configuration.get("LastUpdateStatus", "Successful")
+        if status == "Successful":
+            return time.monotonic() - start
+        if status == "Failed":
+            raise RuntimeError(f"Update of {function_name} failed: {configuration.get('LastUpdateStatusReason')}")
+        if time.monotonic() - start > timeout:
+            raise TimeoutError(f"{function_name} still {status} after {timeout:.0f}s")
+        time.sleep(delay)
+        delay = min(delay * 2, 10)
+
+
+def ensure_cold(client, functions: dict, max_workers: int = 8, **kwargs) -> dict:
+    """
+    Force cold starts for every function concurrently. Returns the seconds taken per function, or the exception
+    for functions that could not be updated.
+    """
+    value = datetime.now().isoformat()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(force_cold, client, function_name, variables, value, **kwargs): function_name
+            for function_name, variables in functions.items()
+        }
+        for future in as_completed(futures):
+            function_name = futures[future]
+            try:
+                results[function_name] = future.result()
+                print(f"{function_name} ready after {results[function_name]:.1f}s")
+            except Exception as error:
+                results[function_name] = error
+                print(f"{function_name} failed: {error}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Force cold starts for the perf_ functions")
+    parser.add_argument("--method", nargs="+", help="Packaging methods to include, e.g. zip image")
+    parser.add_argument("--runtime", nargs="+", help="Runtimes to include, e.g. Python39")
+    parser.add_argument("--memory", nargs="+", type=int, help="Memory sizes to include, e.g. 1024")
+    parser.add_argument("--architecture", nargs="+", choices=matrix.ARCHITECTURES, help="Architectures to include")
+    parser.add_argument("--max-workers", type=int, default=8, help="Functions updated concurrently")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for each function to be ready")
+    parser.add_argument("--endpoint-url", help="Lambda endpoint, e.g. a local stub")
+    args = parser.parse_args()
+
+    session = boto3.session.Session()
+    print("Using region", session.region_name)
+    client = session.client("lambda", endpoint_url=args.endpoint_url)
+    functions = list_perf_functions(client, args.method, args.runtime, args.memory, args.architecture)
+    print(f"Forcing cold starts for {len(functions)} functions")
+
+    start = time.monotonic()
+    results = ensure_cold(client, functions, args.max_workers, timeout=args.timeout)
+    failed = sorted(name for name, result in results.items() if isinstance(result, Exception))
+    print(f"{len(functions) - len(failed)} of {len(functions)} functions ready in {time.monotonic() - start:.1f}s")
+    if failed:
+        raise SystemExit(f"Not ready: {', '.join(failed)}")
 
 
 if __name__ == "__main__":
-    ensure_cold()
+    main()
@@ -1,47 +1,242 @@
 #!/usr/bin/env python3
+"""
+Open-loop load generator for the perf_ functions.
 
+Requests are sent on a fixed schedule, so the arrival rate does not depend on how quickly functions respond,
+and every function gets the same schedule. Each request's client-side latency and outcome are appended to a
+JSONL file. Invocations are asynchronous (Event) by default, so latencies only cover queueing the request; use
+--invocation-type RequestResponse to wait for each function.
+
+Usage:
+    ./scripts/invoke-functions.py 1000
+    ./scripts/invoke-functions.py --profile constant --rps 20 --duration 60
+    ./scripts/invoke-functions.py --invocation-type RequestResponse --tail-logs --profile constant --rps 5 --duration 60
+    ./scripts/invoke-functions.py --profile ramp --rps 1 --to-rps 50 --duration 120
+    ./scripts/invoke-functions.py --profile step --steps 10:30,50:30,100:30
+    ./scripts/invoke-functions.py --profile burst --burst-size 200 --burst-interval 600 --bursts 3
+    ./scripts/invoke-functions.py --functions perf_zip_Python39_1024 --endpoint-url http://127.0.0.1:3001 \\
+        --profile constant --rps 5 --duration 10
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
+from botocore.config import Config
 from tqdm import tqdm
 
-from concurrent.futures import ThreadPoolExecutor, wait
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lambda_datasci_perf import matrix  # noqa: E402
+
+THROTTLING_ERROR_CODES = ("TooManyRequestsException", "ThrottlingException", "ProvisionedThroughputExceededException")
+INIT_DURATION_PATTERN = re.compile(r"Init Duration: ([\d.]+) ms")
+
+
+def constant_schedule(rps: float, duration: float):
+    return [i / rps for i in range(int(rps * duration))]
+
+
+def ramp_schedule(from_rps: float, to_rps: float, duration: float):
+    """
+    Arrivals for a rate rising linearly from from_rps to to_rps over duration
+    """
+    slope = (to_rps - from_rps) / duration
+    if slope == 0:
+        return constant_schedule(from_rps, duration)
+    total = int(from_rps * duration + slope * duration ** 2 / 2)
+    # Invert the cumulative arrivals N(t) = from_rps * t + slope * t^2 / 2 for each arrival n
+    return [(math.sqrt(from_rps ** 2 + 2 * slope * n) - from_rps) / slope for n in range(total)]
+
+
+def step_schedule(steps):
+    """
+    Arrivals for a list of (rps, seconds) steps
+    """
+    schedule, offset = [], 0.0
+    for rps, seconds in steps:
+        schedule.extend(offset + t for t in constant_schedule(rps, seconds))
+        offset += seconds
+    return schedule
+
+
+def burst_schedule(size: int, interval: float, bursts: int):
+    return [burst * interval for burst in range(bursts) for _ in range(size)]
+
+
+def parse_steps(value: str):
+    return [tuple(float(part) for part in step.split(":")) for step in value.split(",")]
 
-def invoke_functions(count_per_function):
-    session = boto3.session.Session()
-    print(f"Using region {session.region_name}")
-    lamb = session.client("lambda")
-    pag = lamb.get_paginator("list_functions")
 
+def invoke_once(client, function_name: str, invocation_type: str, payload: bytes, tail_logs: bool):
+    """
+    Invoke a function once, blocking, and return the client-side latency and outcome
+    """
+    kwargs = {"LogType": "Tail"} if tail_logs and invocation_type == "RequestResponse" else {}
+    start = time.perf_counter()
+    try:
+        response = client.invoke(FunctionName=function_name, InvocationType=invocation_type, Payload=payload,
+                                 **kwargs)
+        response["Payload"].read()
+    except Exception as error:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return {
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "outcome": "throttled" if code in THROTTLING_ERROR_CODES else "error",
+            "error": code or type(error).__name__,
+        }
+    result = {
+        "latency_ms": (time.perf_counter() - start) * 1000,
+        "status_code": response["StatusCode"],
+        "outcome": "function_error" if "FunctionError" in response else "ok",
+    }
+    if "LogResult" in response:
+        match = INIT_DURATION_PATTERN.search(base64.b64decode(response["LogResult"]).decode(errors="replace"))
+        result["init_duration_ms"] = float(match.group(1)) if match else None
+    return result
+
+
+async def run_load(client, function_names, schedule, concurrency: int, invocation_type: str, payload: bytes,
+                   output, tail_logs: bool = False, progress=None):
+    """
+    Send schedule (offsets in seconds) to every function, with at most `concurrency` requests in flight per
+    function. Requests that arrive while a function is at its cap wait; their queueing delay is the
+    difference between sent_s and scheduled_s.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency * len(function_names))
+    semaphores = {name: asyncio.Semaphore(concurrency) for name in function_names}
+    records = []
+    start, started_at = loop.time(), time.time()
+
+    async def send(function_name, offset):
+        async with semaphores[function_name]:
+            sent = loop.time() - start
+            result = await loop.run_in_executor(
+                executor, invoke_once, client, function_name, invocation_type, payload, tail_logs
+            )
+        record = {"function_name": function_name, "timestamp": started_at + sent, "scheduled_s": offset,
+                  "sent_s": sent, **result}
+        output.write(json.dumps(record) + "\n")
+        records.append(record)
+        if progress is not None:
+            progress.update()
+
+    async def dispatch(function_name):
+        tasks = set()
+        for offset in schedule:
+            delay = start + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(send(function_name, offset))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*list(tasks))
+
+    try:
+        await asyncio.gather(*(dispatch(name) for name in function_names))
+    finally:
+        executor.shutdown(wait=False)
+    return records
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else float("nan")
+
+
+def print_summary(records):
+    by_function = {}
+    for record in records:
+        by_function.setdefault(record["function_name"], []).append(record)
+    print(f"{'function':<40} {'sent':>6} {'ok':>6} {'throttled':>9} {'errors':>6} {'cold':>5} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max queue ms':>12}")
+    for function_name, function_records in sorted(by_function.items()):
+        outcomes = [r["outcome"] for r in function_records]
+        latencies = [r["latency_ms"] for r in function_records if r["outcome"] == "ok"]
+        cold = sum(1 for r in function_records if r.get("init_duration_ms") is not None)
+        queued_ms = max((r["sent_s"] - r["scheduled_s"]) * 1000 for r in function_records)
+        print(f"{function_name:<40} {len(function_records):>6} {outcomes.count('ok'):>6} "
+              f"{outcomes.count('throttled'):>9} {outcomes.count('error') + outcomes.count('function_error'):>6} "
+              f"{cold:>5} {percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f} {queued_ms:>12.1f}")
+
+
+def list_perf_functions(client):
     function_names = []
+    for page in client.get_paginator("list_functions").paginate():
+        function_names.extend(
+            f["FunctionName"] for f in page["Functions"]
+            if matrix.parse_function_name(f["FunctionName"]) is not None
+        )
+    return sorted(function_names)
 
-    for page in pag.paginate():
-        function_names.extend([f["FunctionName"] for f in page["Functions"] if f["FunctionName"].startswith("perf_") and "_measure_" not in f["FunctionName"]])
 
-    progs = {}
-    for function_name in function_names:
-        bar = tqdm(range(0, count_per_function))
-        bar.set_description(function_name)
-        progs[function_name] = bar
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the perf_ functions")
+    parser.add_argument("count", nargs="?", type=int,
+                        help="Shorthand for a single burst of this many requests per function")
+    parser.add_argument("--profile", choices=("constant", "ramp", "step", "burst"), default="burst")
+    parser.add_argument("--rps", type=float, default=10, help="Requests per second per function (ramp: start rate)")
+    parser.add_argument("--to-rps", type=float, help="Ramp end rate")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds, for constant and ramp profiles")
+    parser.add_argument("--steps", type=parse_steps, help="Comma-separated rps:seconds steps")
+    parser.add_argument("--burst-size", type=int, default=1000)
+    parser.add_argument("--burst-interval", type=float, default=600, help="Seconds between burst starts")
+    parser.add_argument("--bursts", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50, help="Maximum requests in flight per function")
+    parser.add_argument("--invocation-type", choices=("Event", "RequestResponse"), default="Event",
+                        help="Event (default) queues each request and returns at once. RequestResponse waits for "
+                             "the function, recording its latency and outcome")
+    parser.add_argument("--tail-logs", action="store_true",
+                        help="Request the log tail to record Init Duration for cold starts (RequestResponse only)")
+    parser.add_argument("--event", default="{}", help="JSON event payload")
+    parser.add_argument("--functions", nargs="+", help="Function names (default: all perf_ functions)")
+    parser.add_argument("--endpoint-url", help="Lambda endpoint, e.g. a local stand-in such as sam local start-lambda")
+    parser.add_argument("--output", default=f"invocations-{int(time.time())}.jsonl",
+                        help="JSONL file to append per-request records to")
+    args = parser.parse_args()
+    if args.tail_logs and args.invocation_type != "RequestResponse":
+        parser.error("--tail-logs requires --invocation-type RequestResponse")
 
-    def perform_invocations(function_name):
-        for _ in progs[function_name]:
-            lamb.invoke_async(FunctionName=function_name, InvokeArgs=b"{}")
+    if args.count is not None:
+        schedule = burst_schedule(args.count, args.burst_interval, 1)
+    elif args.profile == "constant":
+        schedule = constant_schedule(args.rps, args.duration)
+    elif args.profile == "ramp":
+        schedule = ramp_schedule(args.rps, args.to_rps if args.to_rps is not None else args.rps, args.duration)
+    elif args.profile == "step":
+        if not args.steps:
+            parser.error("--profile step requires --steps")
+        schedule = step_schedule(args.steps)
+    else:
+        schedule = burst_schedule(args.burst_size, args.burst_interval, args.bursts)
 
-    futs = []
-    with ThreadPoolExecutor(max_workers=len(function_names)) as ex:
-        for function_name in function_names:
-            futs.append(ex.submit(perform_invocations, function_name))
+    session = boto3.session.Session()
+    print(f"Using region {session.region_name}")
+    # Throttles are recorded rather than retried
+    config = Config(retries={"mode": "standard", "total_max_attempts": 1}, read_timeout=900)
+    client = session.client("lambda", endpoint_url=args.endpoint_url, config=config)
+    function_names = args.functions or list_perf_functions(client)
+    # One pooled connection for every request that can be in flight
+    client = session.client("lambda", endpoint_url=args.endpoint_url, config=config.merge(
+        Config(max_pool_connections=args.concurrency * len(function_names))
+    ))
 
-    wait(futs)
+    print(f"Sending {len(schedule)} requests to each of {len(function_names)} functions over "
+          f"{schedule[-1] if schedule else 0:.1f}s, recording to {args.output}")
+    with open(args.output, "a") as output, tqdm(total=len(schedule) * len(function_names)) as progress:
+        records = asyncio.run(run_load(client, function_names, schedule, args.concurrency, args.invocation_type,
+                                       args.event.encode(), output, args.tail_logs, progress))
+    print_summary(records)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python invoke-functions.py <num_messages_per_function>")
-    else:
-        try:
-            num_messages = int(sys.argv[1])
-            invoke_functions(num_messages)
-        except ValueError:
-            print("Please provide a valid integer for the number of messages.")
+    main()
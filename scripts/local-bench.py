@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Run handler.handle_event off-cloud to measure cold and warm performance.
+
+Each cold run starts a fresh interpreter that imports the handler and invokes it once. Warm runs are
+repeated in-process in a separate interpreter after one discarded invocation. S3 is replaced with an
+in-memory stand-in, so no AWS account or network access is needed.
+
+Usage:
+    ./scripts/local-bench.py --cold-runs 10 --warm-runs 50 --save-baseline baseline.json
+    ./scripts/local-bench.py --baseline baseline.json --tolerance 0.1
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda_datasci_perf", "function")
+LOCAL_BUCKET_NAME = "local-bench"
+PERCENTILES = (50, 95, 99)
+
+
+class LocalS3Error(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class LocalS3Client:
+    """
+    In-memory stand-in for the subset of the S3 client API used by the handler
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self._uploads = {}
+
+    def put_object(self, Bucket, Key, Body, **_kwargs):
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self.objects[(Bucket, Key)] = data
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def head_bucket(self, Bucket, **_kwargs):
+        return {}
+
+    def head_object(self, Bucket, Key, **_kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise LocalS3Error("404")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def get_object(self, Bucket, Key, Range=None, **_kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise LocalS3Error("NoSuchKey")
+        data = self.objects[(Bucket, Key)]
+        if Range is not None:
+            start, end = Range.removeprefix("bytes=").split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def create_multipart_upload(self, Bucket, Key, **_kwargs):
+        upload_id = str(len(self._uploads) + 1)
+        self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **_kwargs):
+        data = bytes(Body)
+        self._uploads[UploadId][PartNumber] = data
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **_kwargs):
+        parts = self._uploads.pop(UploadId)
+        data = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+        self.objects[(Bucket, Key)] = data
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}-{len(parts)}"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **_kwargs):
+        self._uploads.pop(UploadId, None)
+
+    def generate_presigned_url(self, _operation, Params, **_kwargs):
+        return f"file://{Params['Bucket']}/{Params['Key']}"
+
+
+class FakeLambdaContext:
+    def __init__(self, function_name, request_id, memory_limit_in_mb=1024):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.invoked_function_arn = f"arn:aws:lambda:local:000000000000:function:{function_name}"
+        self.aws_request_id = request_id
+        self.log_group_name = f"/aws/lambda/{function_name}"
+        self.log_stream_name = "local"
+
+    def get_remaining_time_in_millis(self):
+        return 660_000
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(args):
+    """
+    Executed in a fresh interpreter: import the handler (the init phase), then invoke it
+    """
+    sys.path.insert(0, os.path.abspath(FUNCTION_DIR))
+    event = json.loads(args.event)
+
+    opened_files = set()
+    if args.trace_output:
+        def record_open(audit_event, audit_args):
+            if audit_event == "open" and isinstance(audit_args[0], str):
+                opened_files.add(os.path.abspath(audit_args[0]))
+        sys.addaudithook(record_open)
+
+    init_start = time.perf_counter()
+    import handler
+    # Swapped in before the upload warm-up (skipped at import, see S3_WARMUP), so init_ms includes it without AWS
+    handler.s3_client = LocalS3Client()
+    if handler.BACKGROUND_UPLOAD:
+        handler.warm_up_uploads()
+    init_ms = (time.perf_counter() - init_start) * 1000
+
+    invoke_ms = []
+    for i in range(args.invocations):
+        context = FakeLambdaContext(args.function_name, f"local-{os.getpid()}-{i}")
+        start = time.perf_counter()
+        handler.handle_event(event, context)
+        invoke_ms.append((time.perf_counter() - start) * 1000)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "init_ms": init_ms,
+            "invoke_ms": invoke_ms,
+            "import_timings_us": handler.import_timer.timings,
+            "peak_rss_mb": peak_rss_mb(),
+        }, f)
+
+    if args.trace_output:
+        with open(args.trace_output, "w") as f:
+            json.dump(sorted(loaded_files(opened_files)), f, indent=1)
+
+
+def loaded_files(opened_files):
+    """
+    Every file the process used: opened files (including module sources), module files and mapped shared libraries
+    """
+    files = set(opened_files)
+    files.update(module.__file__ for module in list(sys.modules.values()) if getattr(module, "__file__", None))
+    with open("/proc/self/maps") as maps:
+        for line in maps:
+            fields = line.split(maxsplit=5)
+            if len(fields) == 6 and fields[5].startswith("/"):
+                files.add(fields[5].strip())
+    return {os.path.realpath(path) for path in files if os.path.isfile(path)}
+
+
+def spawn_child(event, invocations, function_name, extra_env=None, trace_output=None):
+    env = {
+        **os.environ,
+        **(extra_env or {}),
+        "BUCKET_NAME": LOCAL_BUCKET_NAME,
+        "S3_WARMUP": "false",
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "POWERTOOLS_TRACE_DISABLED": "true",
+        "POWERTOOLS_METRICS_NAMESPACE": "LocalBench",
+        "POWERTOOLS_SERVICE_NAME": function_name,
+    }
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--event", event,
+                   "--invocations", str(invocations), "--function-name", function_name, "--output", output.name]
+        if trace_output:
+            command += ["--trace-output", trace_output]
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(output.name) as f:
+            return json.load(f)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def distribution(values):
+    return {f"p{pct}": percentile(values, pct) for pct in PERCENTILES}
+
+
+def run_benchmark(cold_runs, warm_runs, event, function_name):
+    cold = [spawn_child(event, 1, function_name) for _ in range(cold_runs)]
+    # The first invocation in the warm process is a cold start, so it is excluded
+    warm = spawn_child(event, warm_runs + 1, function_name) if warm_runs else None
+
+    import_names = sorted({name for run in cold for name in run["import_timings_us"]})
+    return {
+        "event": json.loads(event),
+        "cold_runs": cold_runs,
+        "warm_runs": warm_runs,
+        "init_ms": distribution([run["init_ms"] for run in cold]),
+        "cold_invoke_ms": distribution([run["invoke_ms"][0] for run in cold]),
+        "warm_invoke_ms": distribution(warm["invoke_ms"][1:]) if warm else None,
+        "import_ms": {
+            name: distribution([run["import_timings_us"][name] / 1000 for run in cold if name in run["import_timings_us"]])
+            for name in import_names
+        },
+        "peak_rss_mb": {
+            "cold": max(run["peak_rss_mb"] for run in cold),
+            "warm": warm["peak_rss_mb"] if warm else None,
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each headline percentile against the baseline and return the metrics that regressed beyond the tolerance
+    """
+    regressions = []
+    print(f"{'metric':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric in ("init_ms", "cold_invoke_ms", "warm_invoke_ms"):
+        for stat in ("p50", "p95", "p99"):
+            current = (results.get(metric) or {}).get(stat)
+            previous = (baseline.get(metric) or {}).get(stat)
+            if current is None or not previous:
+                continue
+            change = (current - previous) / previous
+            flag = " !" if change > tolerance else ""
+            print(f"{metric + ' ' + stat:<28} {previous:>10.1f} {current:>10.1f} {change:>+8.1%}{flag}")
+            if change > tolerance:
+                regressions.append(f"{metric} {stat}")
+    previous_rss, current_rss = baseline["peak_rss_mb"]["cold"], results["peak_rss_mb"]["cold"]
+    rss_change = (current_rss - previous_rss) / previous_rss
+    print(f"{'peak_rss_mb cold':<28} {previous_rss:>10.1f} {current_rss:>10.1f} {rss_change:>+8.1%}")
+    if rss_change > tolerance:
+        regressions.append("peak_rss_mb cold")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local cold/warm benchmark for handler.handle_event")
+    parser.add_argument("--cold-runs", type=int, default=5, help="Number of fresh-interpreter cold starts")
+    parser.add_argument("--warm-runs", type=int, default=20, help="Number of in-process warm invocations")
+    parser.add_argument("--event", default="{}", help="JSON event passed to the handler")
+    parser.add_argument("--function-name", default="perf_local_bench")
+    parser.add_argument("--save-baseline", help="Write the results to this path")
+    parser.add_argument("--baseline", help="Compare against results saved with --save-baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative increase over the baseline treated as a regression (default 0.1)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--invocations", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    parser.add_argument("--trace-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    results = run_benchmark(args.cold_runs, args.warm_runs, args.event, args.function_name)
+    print(json.dumps(results, indent=4))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
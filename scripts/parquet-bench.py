@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Sweep Parquet writer options across dataset sizes and measure the write path off-cloud.
+
+For every combination of the options given and every size, the orders table generated by the handler is
+written to memory with parquet_writer.write_table, then read back, both in full and with the column
+projection and Order ID predicate used by the read workload. Write time, output size, the writer's Arrow
+memory peak and both read times are reported, along with whether each configuration is on the
+Pareto front of write time and output size for its size and CPU count.
+
+Lambda allocates CPU in proportion to memory (one vCPU at 1769 MB, six at 10240 MB), so --cpu-counts
+approximates the memory tiers by limiting Arrow's thread pool.
+
+Usage:
+    ./scripts/parquet-bench.py
+    ./scripts/parquet-bench.py --sizes 100000 1000000 --compression snappy zstd --compression-level 1 3 9
+    ./scripts/parquet-bench.py --row-group-size 100000 1000000 --cpu-counts 1 2 6 --output parquet-bench.json
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda_datasci_perf", "function")
+sys.path.insert(0, os.path.abspath(FUNCTION_DIR))
+
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+import arrow_datagen  # noqa: E402
+import parquet_options  # noqa: E402
+import parquet_writer  # noqa: E402
+
+READ_COLUMNS = ["Order ID", "Product Category", "Unit Price"]
+READ_SELECTIVITY = 0.1
+RESULT_FIELDS = ("num_rows", "cpu_count", "options", "write_ms", "size_bytes", "bytes_per_row",
+                 "writer_peak_bytes", "read_ms", "filtered_read_ms", "row_groups", "pareto")
+
+
+def option_grid(args) -> list:
+    """
+    Every combination of the swept options. Codecs without levels are included once, with no level.
+    """
+    grid = []
+    for compression, level, use_dictionary, write_statistics, row_group_size, data_page_size in itertools.product(
+            args.compression, args.compression_level or [None], args.use_dictionary or [None],
+            args.write_statistics or [None], args.row_group_size or [None], args.data_page_size or [None]):
+        if compression == "none" or not pa.Codec.supports_compression_level(compression):
+            level = None
+        options = {
+            "compression": compression,
+            "compression_level": level,
+            "use_dictionary": use_dictionary,
+            "write_statistics": write_statistics,
+            "row_group_size": row_group_size,
+            "data_page_size": data_page_size,
+        }
+        options = parquet_writer.validate({name: value for name, value in options.items() if value is not None})
+        if options not in grid:
+            grid.append(options)
+    return grid
+
+
+def measure_write(table, options) -> tuple:
+    # A proxy pool per write gives the writer's own peak (encoding and compression buffers), excluding the
+    # output buffer, whose size is the output size
+    pool = pa.proxy_memory_pool(pa.default_memory_pool())
+    start = time.perf_counter()
+    buf = pa.BufferOutputStream()
+    parquet_writer.write_table(table, buf, options, memory_pool=pool)
+    data = buf.getvalue()
+    return data, (time.perf_counter() - start) * 1000, pool.max_memory()
+
+
+def measure_read(data, **kwargs) -> float:
+    start = time.perf_counter()
+    pq.read_table(pa.BufferReader(data), **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(table, options, repeats) -> dict:
+    writes = [measure_write(table, options) for _ in range(repeats)]
+    data = writes[-1][0]
+    max_order_id = int(table.num_rows * READ_SELECTIVITY)
+    return {
+        "num_rows": table.num_rows,
+        "options": options,
+        "write_ms": statistics.median(elapsed_ms for _, elapsed_ms, _ in writes),
+        "size_bytes": data.size,
+        "bytes_per_row": data.size / table.num_rows,
+        "writer_peak_bytes": max(peak for _, _, peak in writes),
+        "read_ms": statistics.median(measure_read(data) for _ in range(repeats)),
+        "filtered_read_ms": statistics.median(
+            measure_read(data, columns=READ_COLUMNS, filters=[("Order ID", "<=", max_order_id)])
+            for _ in range(repeats)
+        ),
+        "row_groups": pq.read_metadata(pa.BufferReader(data)).num_row_groups,
+    }
+
+
+def mark_pareto(results):
+    """
+    Flag the results that no other result with the same size and CPU count beats on both write time and size
+    """
+    for result in results:
+        result["pareto"] = not any(
+            other is not result
+            and (other["num_rows"], other["cpu_count"]) == (result["num_rows"], result["cpu_count"])
+            and other["write_ms"] <= result["write_ms"] and other["size_bytes"] <= result["size_bytes"]
+            and (other["write_ms"], other["size_bytes"]) != (result["write_ms"], result["size_bytes"])
+            for other in results
+        )
+
+
+def format_options(options) -> str:
+    return " ".join(f"{name}={value}" for name, value in options.items()) or "defaults"
+
+
+def print_results(results):
+    print(f"{'rows':>9} {'cpus':>4} {'write ms':>9} {'MB':>8} {'B/row':>6} {'peak MB':>8} {'read ms':>8} "
+          f"{'filt ms':>8} {'rgs':>4}  options")
+    for result in sorted(results, key=lambda r: (r["num_rows"], r["cpu_count"], r["write_ms"])):
+        print(f"{result['num_rows']:>9} {result['cpu_count']:>4} {result['write_ms']:>9.1f} "
+              f"{result['size_bytes'] / 1e6:>8.2f} {result['bytes_per_row']:>6.2f} "
+              f"{result['writer_peak_bytes'] / 1e6:>8.1f} {result['read_ms']:>8.1f} {result['filtered_read_ms']:>8.1f} "
+              f"{result['row_groups']:>4}{' *' if result['pareto'] else '  '}{format_options(result['options'])}")
+    print("* Pareto-optimal for write time and size")
+
+
+def write_output(results, path):
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for result in results:
+                writer.writerow({**result, "options": json.dumps(result["options"])})
+    else:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+def parse_bool(value):
+    return parquet_options.OPTIONS["write_statistics"](value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Parquet writer options for the orders table")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100_000, 1_000_000], help="Row counts")
+    parser.add_argument("--compression", nargs="+", default=["none", "snappy", "lz4", "zstd", "gzip"],
+                        choices=parquet_options.COMPRESSION_CODECS)
+    parser.add_argument("--compression-level", nargs="+", type=int,
+                        help="Levels, applied to the codecs that support them")
+    parser.add_argument("--use-dictionary", nargs="+", type=parse_bool, help="e.g. true false")
+    parser.add_argument("--write-statistics", nargs="+", type=parse_bool, help="e.g. true false")
+    parser.add_argument("--row-group-size", nargs="+", type=int, help="Rows per row group")
+    parser.add_argument("--data-page-size", nargs="+", type=int, help="Bytes per data page")
+    parser.add_argument("--cpu-counts", nargs="+", type=int, help="Arrow thread pool sizes, e.g. 1 2 6")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per measurement; the median is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this .json or .csv file")
+    args = parser.parse_args()
+
+    grid = option_grid(args)
+    cpu_counts = args.cpu_counts or [pa.cpu_count()]
+    print(f"{len(grid)} option combinations x {len(args.sizes)} sizes x {len(cpu_counts)} CPU counts")
+
+    results = []
+    for num_rows in args.sizes:
+        table = arrow_datagen.generate_orders_table(num_rows, arrow_datagen.make_rng(args.seed))
+        for cpu_count in cpu_counts:
+            pa.set_cpu_count(cpu_count)
+            for options in grid:
+                results.append({**benchmark(table, options, args.repeats), "cpu_count": cpu_count})
+        del table
+
+    mark_pareto(results)
+    print_results(results)
+    if args.output:
+        write_output(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
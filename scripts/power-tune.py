@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Recommend a memory configuration from per-invocation REPORT data.
+
+Usage:
+    ./scripts/power-tune.py reports.jsonl --slo-ms 1500
+    ./scripts/power-tune.py exported/perf_zip_Python39_1024/*.gz exported/perf_image_Python39_1024/*.gz --slo-ms 800
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lambda_datasci_perf.analysis import power_tuning  # noqa: E402
+
+DISPLAY_COLUMNS = [
+    "method", "runtime", "architecture", "memory_size_mb", "invocations", "cold_start_rate", "p50_ms", "p95_ms", "p99_ms",
+    "expected_latency_ms", "max_memory_used_mb", "cost_per_million_usd", "pareto",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost/latency power-tuning analysis for the function matrix")
+    parser.add_argument("paths", nargs="+", help="JSONL captures or CloudWatch Logs export files (.gz or text)")
+    parser.add_argument("--function-name", help="Function name for export files whose path does not contain it")
+    parser.add_argument("--slo-ms", type=float, help="Latency SLO to recommend a configuration for")
+    parser.add_argument("--slo-stat", default="p99_ms", choices=("p50_ms", "p95_ms", "p99_ms", "expected_latency_ms"))
+    parser.add_argument("--min-memory-headroom", type=float, default=0.1,
+                        help="Minimum unused fraction of configured memory at peak (default 0.1)")
+    parser.add_argument("--architecture", choices=sorted(power_tuning.PRICE_PER_GB_SECOND),
+                        help="Price every function for this architecture, instead of the one in its name")
+    parser.add_argument("--price-per-gb-second", type=float, help="Override the compute price")
+    parser.add_argument("--output", help="Write the full summary to this CSV path")
+    args = parser.parse_args()
+
+    reports = power_tuning.load_reports(args.paths, args.function_name)
+    summary = power_tuning.analyse(reports, args.architecture, args.price_per_gb_second)
+
+    with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 250,
+                           "display.float_format", "{:.2f}".format):
+        print(summary[DISPLAY_COLUMNS])
+        print()
+        print("Pareto frontier (cost vs. expected latency):")
+        print(summary[summary["pareto"]].sort_values("cost_per_million_usd")[
+            ["expected_latency_ms", "cost_per_million_usd"]
+        ])
+
+    if args.output:
+        summary.to_csv(args.output)
+
+    if args.slo_ms is not None:
+        recommended = power_tuning.recommend(summary, args.slo_ms, args.slo_stat, args.min_memory_headroom)
+        print()
+        if recommended is None:
+            print(f"No configuration meets {args.slo_stat} <= {args.slo_ms} ms with the required memory headroom")
+        else:
+            print(f"Recommended: {recommended.name} ({args.slo_stat} {recommended[args.slo_stat]:.1f} ms, "
+                  f"${recommended['cost_per_million_usd']:.2f} per million invocations)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Measure how much of the dependency import time is bytecode compilation.
+
+The Lambda dependencies are installed once, then copied into two variants: one with every .pyc removed
+(as the perf_zip_* bundling does) and one precompiled with unchecked-hash pycs (as perf_zip_pyc_* does).
+Each variant is imported in fresh interpreters with -B, so, like Lambda's read-only filesystem, no
+bytecode cache can be written between runs.
+
+Usage:
+    ./scripts/pyc-impact.py --runs 10
+    ./scripts/pyc-impact.py --target /path/to/installed/dependencies
+"""
+
+import argparse
+import compileall
+import json
+import os
+import py_compile
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda_datasci_perf", "function")
+DEFAULT_MODULES = "numpy,pandas,pyarrow,pyarrow.parquet,aws_lambda_powertools"
+
+IMPORT_SNIPPET = """
+import importlib, json, sys, time
+start = time.perf_counter()
+timings = {}
+for name in sys.argv[1].split(','):
+    module_start = time.perf_counter()
+    importlib.import_module(name)
+    timings[name] = (time.perf_counter() - module_start) * 1000
+print(json.dumps({"total_ms": (time.perf_counter() - start) * 1000, "modules_ms": timings}))
+"""
+
+
+def remove_bytecode(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        if "__pycache__" in dirnames:
+            shutil.rmtree(os.path.join(dirpath, "__pycache__"))
+            dirnames.remove("__pycache__")
+        for filename in filenames:
+            if filename.endswith((".pyc", ".pyo")):
+                os.remove(os.path.join(dirpath, filename))
+
+
+def precompile(root):
+    compileall.compile_dir(
+        root, quiet=1, force=True, workers=0, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
+
+
+def directory_size(root):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, _dirnames, filenames in os.walk(root)
+        for filename in filenames
+    )
+
+
+def time_imports(target, modules, runs):
+    env = {**os.environ, "PYTHONPATH": target, "PYTHONDONTWRITEBYTECODE": "1"}
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-B", "-s", "-c", IMPORT_SNIPPET, modules],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def summarise(results):
+    module_names = results[0]["modules_ms"].keys()
+    return {
+        "total_ms": statistics.median(result["total_ms"] for result in results),
+        "modules_ms": {
+            name: statistics.median(result["modules_ms"][name] for result in results) for name in module_names
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dependency import time with and without precompiled bytecode")
+    parser.add_argument("--target", help="Directory with installed dependencies (default: pip install into a temp dir)")
+    parser.add_argument("--requirements", default=os.path.join(FUNCTION_DIR, "requirements-lambda.txt"))
+    parser.add_argument("--modules", default=DEFAULT_MODULES, help="Comma-separated modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per variant")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = args.target
+        if source is None:
+            source = os.path.join(workdir, "installed")
+            subprocess.run(
+                [sys.executable, "-m", "pip", "install", "-q", "-r", args.requirements, "-t", source], check=True
+            )
+
+        no_pyc = os.path.join(workdir, "no_pyc")
+        shutil.copytree(source, no_pyc)
+        remove_bytecode(no_pyc)
+
+        with_pyc = os.path.join(workdir, "with_pyc")
+        shutil.copytree(no_pyc, with_pyc)
+        precompile(with_pyc)
+
+        no_pyc_summary = summarise(time_imports(no_pyc, args.modules, args.runs))
+        with_pyc_summary = summarise(time_imports(with_pyc, args.modules, args.runs))
+        no_pyc_size, with_pyc_size = directory_size(no_pyc), directory_size(with_pyc)
+
+    print(f"{'module':<28} {'no pyc ms':>10} {'pyc ms':>10} {'saved ms':>10}")
+    for name, no_pyc_ms in no_pyc_summary["modules_ms"].items():
+        with_pyc_ms = with_pyc_summary["modules_ms"][name]
+        print(f"{name:<28} {no_pyc_ms:>10.1f} {with_pyc_ms:>10.1f} {no_pyc_ms - with_pyc_ms:>10.1f}")
+    saved_ms = no_pyc_summary["total_ms"] - with_pyc_summary["total_ms"]
+    print(f"{'total':<28} {no_pyc_summary['total_ms']:>10.1f} {with_pyc_summary['total_ms']:>10.1f} {saved_ms:>10.1f}")
+    print(f"Compile share of import time: {saved_ms / no_pyc_summary['total_ms']:.1%}")
+    print(f"Package size: {no_pyc_size / 1e6:.1f} MB without pycs, {with_pyc_size / 1e6:.1f} MB with pycs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Build a minimal ZIP asset containing only the dependency files the handler actually uses.
+
+The handler workload is run locally (see local-bench.py) against the installed dependencies while
+recording every module, opened file and mapped shared library. Only those files, plus anything matching
+the allowlist, are copied into the output directory together with the function sources. The sizes of
+both trees and the cold init time of each are then reported.
+
+The dependencies must be installed for the target platform, and the interpreter running this script must
+not have them installed itself, or files missing from the minimal asset would be found elsewhere. Running
+inside the bundling image (e.g. public.ecr.aws/sam/build-python3.9) satisfies both.
+
+Usage:
+    ./scripts/tree-shake.py --target deps/ --output shaken/ --event '{}' --event '{"streaming": true}'
+"""
+
+import argparse
+import fnmatch
+import glob
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTION_DIR = os.path.join(SCRIPTS_DIR, "..", "lambda_datasci_perf", "function")
+
+# Files that are read lazily or only on code paths the workload may not exercise
+DEFAULT_ALLOWLIST = (
+    "*.dist-info/*",
+    "*/py.typed",
+)
+
+
+def load_local_bench():
+    spec = importlib.util.spec_from_file_location("local_bench", os.path.join(SCRIPTS_DIR, "local-bench.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def trace_used_files(local_bench, target, events):
+    used = set()
+    for event in events:
+        with tempfile.NamedTemporaryFile(suffix=".json") as trace:
+            local_bench.spawn_child(event, 1, "perf_tree_shake", extra_env={"PYTHONPATH": target}, trace_output=trace.name)
+            with open(trace.name) as f:
+                used.update(json.load(f))
+    return used
+
+
+def read_allowlist(allowlist_path, extra_patterns):
+    patterns = list(DEFAULT_ALLOWLIST) + list(extra_patterns)
+    if allowlist_path:
+        with open(allowlist_path) as f:
+            patterns += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return patterns
+
+
+def select_files(target, used, patterns):
+    target = os.path.realpath(target)
+    selected = []
+    for dirpath, _dirnames, filenames in os.walk(target):
+        for filename in filenames:
+            path = os.path.realpath(os.path.join(dirpath, filename))
+            relative = os.path.relpath(path, target)
+            if path in used or any(fnmatch.fnmatch(relative, pattern) for pattern in patterns):
+                selected.append(relative)
+    return selected
+
+
+def tree_size(root):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, _dirnames, filenames in os.walk(root)
+        for filename in filenames
+    )
+
+
+def copy_asset(target, relative_paths, output):
+    for relative in relative_paths:
+        destination = os.path.join(output, relative)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copy2(os.path.join(target, relative), destination)
+    for source in glob.glob(os.path.join(FUNCTION_DIR, "*.py")):
+        shutil.copy2(source, output)
+
+
+def median_init_ms(local_bench, target, event, runs):
+    return statistics.median(
+        local_bench.spawn_child(event, 1, "perf_tree_shake", extra_env={"PYTHONPATH": target})["init_ms"]
+        for _ in range(runs)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tree-shake the Lambda dependencies down to the files actually used")
+    parser.add_argument("--target", help="Directory with installed dependencies (default: pip install into a temp dir)")
+    parser.add_argument("--requirements", default=os.path.join(FUNCTION_DIR, "requirements-lambda.txt"))
+    parser.add_argument("--output", required=True, help="Directory to write the minimal asset to")
+    parser.add_argument("--event", action="append", help="Workload event to trace (repeatable, default '{}')")
+    parser.add_argument("--allowlist", help="File of extra glob patterns (relative to --target) to always keep")
+    parser.add_argument("--allow", action="append", default=[], help="Extra glob pattern to always keep (repeatable)")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per tree when comparing init time")
+    args = parser.parse_args()
+
+    events = args.event or ["{}"]
+    local_bench = load_local_bench()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        target = args.target
+        if target is None:
+            target = os.path.join(workdir, "installed")
+            subprocess.run(
+                [sys.executable, "-m", "pip", "install", "-q", "-r", args.requirements, "-t", target], check=True
+            )
+
+        used = trace_used_files(local_bench, target, events)
+        selected = select_files(target, used, read_allowlist(args.allowlist, args.allow))
+
+        if os.path.exists(args.output):
+            shutil.rmtree(args.output)
+        copy_asset(target, selected, args.output)
+
+        # Running every traced event against the minimal tree verifies nothing required was dropped
+        for event in events:
+            local_bench.spawn_child(event, 1, "perf_tree_shake", extra_env={"PYTHONPATH": args.output})
+
+        full_size, shaken_size = tree_size(target), tree_size(args.output)
+        full_init_ms = median_init_ms(local_bench, target, events[0], args.runs)
+        shaken_init_ms = median_init_ms(local_bench, args.output, events[0], args.runs)
+
+    print(f"Kept {len(selected)} dependency files")
+    print(f"Size: {full_size / 1e6:.1f} MB -> {shaken_size / 1e6:.1f} MB "
+          f"({(full_size - shaken_size) / 1e6:.1f} MB saved, {1 - shaken_size / full_size:.1%})")
+    print(f"Median init: {full_init_ms:.1f} ms -> {shaken_init_ms:.1f} ms ({shaken_init_ms - full_init_ms:+.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
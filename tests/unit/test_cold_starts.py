@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from lambda_datasci_perf.analysis import cold_starts
+
+
+def make_reports(function_names, per_function=10):
+    timestamps = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(per_function), unit="s")
+    return pd.DataFrame([
+        {"function_name": name, "timestamp": timestamp, "init_duration_ms": float(index)}
+        for name in function_names for index, timestamp in enumerate(timestamps)
+    ])
+
+
+def test_add_matrix_columns_parses_architecture():
+    reports = cold_starts.add_matrix_columns(make_reports(["perf_zip_Python39_1024", "perf_zip_Python39_arm64_1024"]))
+    assert set(reports["architecture"]) == {"x86_64", "arm64"}
+    assert set(reports["method"]) == {"zip"}
+
+
+def test_windowed_stats_skips_functions_outside_the_matrix():
+    reports = make_reports(["perf_zip_Python39_1024", "some-other-function", "perf_image_Python39_arm64_1024"])
+    stats = cold_starts.windowed_stats(reports, freq="5s")
+    assert set(stats.index.get_level_values("method")) == {"zip", "image"}
+    assert stats["count"].sum() == 20
+    zip_stats = stats.xs(("zip", "Python39", "x86_64", 1024), level=["method", "runtime", "architecture", "memory"])
+    assert zip_stats["p50"].tolist() == [2.0, 7.0]
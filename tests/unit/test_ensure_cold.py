@@ -0,0 +1,107 @@
+import importlib.util
+import os
+
+from botocore.exceptions import ClientError
+
+# scripts/ensure-cold.py is not importable by name, so it is loaded from the file
+_spec = importlib.util.spec_from_file_location(
+    "ensure_cold", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "ensure-cold.py")
+)
+ensure_cold = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(ensure_cold)
+
+FUNCTION_NAMES = [
+    "perf_zip_Python39_1024",
+    "perf_zip_Python39_arm64_1024",
+    "perf_image_Python311_1769",
+    "perf_",
+    "some-other-function",
+]
+
+
+def client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, "UpdateFunctionConfiguration")
+
+
+class FakePaginator:
+    def paginate(self):
+        # Two pages, as list_functions returns at most 50 functions per page
+        return [
+            {"Functions": [{"FunctionName": name, "Environment": {"Variables": {"NAME": name}}}
+                           for name in FUNCTION_NAMES[:2]]},
+            {"Functions": [{"FunctionName": name} for name in FUNCTION_NAMES[2:]]},
+        ]
+
+
+class FakeLambdaClient:
+    """
+    Fails the first update of each function with `update_errors`, and reports each update as InProgress for
+    `in_progress_polls` polls before `final_status`
+    """
+
+    def __init__(self, update_errors=("ResourceConflictException",), in_progress_polls=2, final_status="Successful"):
+        self.update_errors = update_errors
+        self.in_progress_polls = in_progress_polls
+        self.final_status = final_status
+        self.updates = {}
+        self.update_attempts = {}
+        self.polls = {}
+
+    def get_paginator(self, _operation):
+        return FakePaginator()
+
+    def update_function_configuration(self, FunctionName, Environment):
+        attempt = self.update_attempts.get(FunctionName, 0)
+        self.update_attempts[FunctionName] = attempt + 1
+        if attempt < len(self.update_errors):
+            raise client_error(self.update_errors[attempt])
+        self.updates[FunctionName] = Environment["Variables"]
+        return {"LastUpdateStatus": "InProgress"}
+
+    def get_function_configuration(self, FunctionName):
+        self.polls[FunctionName] = self.polls.get(FunctionName, 0) + 1
+        if self.polls[FunctionName] <= self.in_progress_polls:
+            return {"LastUpdateStatus": "InProgress"}
+        return {"LastUpdateStatus": self.final_status, "LastUpdateStatusReason": "test"}
+
+
+def test_list_perf_functions_selects_matrix_functions():
+    client = FakeLambdaClient()
+    assert ensure_cold.list_perf_functions(client) == {
+        "perf_zip_Python39_1024": {"NAME": "perf_zip_Python39_1024"},
+        "perf_zip_Python39_arm64_1024": {"NAME": "perf_zip_Python39_arm64_1024"},
+        "perf_image_Python311_1769": {},
+    }
+    assert list(ensure_cold.list_perf_functions(client, methods=["zip"], architectures=["arm64"])) == [
+        "perf_zip_Python39_arm64_1024"
+    ]
+    assert list(ensure_cold.list_perf_functions(client, runtimes=["Python311"], memory_sizes=[1769])) == [
+        "perf_image_Python311_1769"
+    ]
+
+
+def test_force_cold_retries_conflicts_and_waits_for_the_update():
+    client = FakeLambdaClient()
+    ensure_cold.force_cold(client, "perf_zip_Python39_1024", {"NAME": "x"}, "v1", base_delay=0, poll_interval=0)
+    assert client.update_attempts["perf_zip_Python39_1024"] == 2
+    assert client.updates["perf_zip_Python39_1024"] == {"NAME": "x", "COLD_START_FORCER": "v1"}
+    assert client.polls["perf_zip_Python39_1024"] == 3
+
+
+def test_ensure_cold_reports_failures_per_function():
+    client = FakeLambdaClient(update_errors=("ResourceConflictException", "InvalidParameterValueException"))
+    functions = ensure_cold.list_perf_functions(client)
+    results = ensure_cold.ensure_cold(client, functions, max_workers=2, base_delay=0, poll_interval=0)
+    assert set(results) == set(functions)
+    # Errors that are not retryable are raised after the first one that is
+    assert all(isinstance(result, ClientError) for result in results.values())
+    assert all(attempts == 2 for attempts in client.update_attempts.values())
+
+    client = FakeLambdaClient(final_status="Failed")
+    results = ensure_cold.ensure_cold(client, functions, base_delay=0, poll_interval=0)
+    assert all(isinstance(result, RuntimeError) for result in results.values())
+
+    client = FakeLambdaClient()
+    results = ensure_cold.ensure_cold(client, functions, base_delay=0, poll_interval=0)
+    assert all(isinstance(result, float) for result in results.values())
+    assert len({variables["COLD_START_FORCER"] for variables in client.updates.values()}) == 1
@@ -0,0 +1,112 @@
+import datetime
+import itertools
+
+import pandas as pd
+import pytest
+
+from lambda_datasci_perf.analysis import ingest
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+LOG_GROUPS = ["/aws/lambda/perf_zip_Python39_1024", "/aws/lambda/perf_image_Python39_1024"]
+LIMIT = 5
+
+
+def make_events():
+    # 12 events for each function in the first minute, more than LIMIT, and 2 in the second. Only the
+    # first event of each function is a cold start.
+    events = []
+    for log_group in LOG_GROUPS:
+        function_name = log_group.removeprefix("/aws/lambda/")
+        for index, second in enumerate([*range(0, 60, 5), 70, 100]):
+            events.append({
+                "log_group": log_group,
+                "timestamp": int(START.timestamp()) + second,
+                "row": [
+                    {"field": "@timestamp",
+                     "value": (START + datetime.timedelta(seconds=second)).strftime("%Y-%m-%d %H:%M:%S.000")},
+                    {"field": "@requestId", "value": f"{function_name}-{index}"},
+                    {"field": "function_name", "value": function_name},
+                    {"field": "@duration", "value": "12.5"},
+                    {"field": "@billedDuration", "value": "13"},
+                    {"field": "@memorySize", "value": "1024000000"},
+                    {"field": "@maxMemoryUsed", "value": "256000000"},
+                    *([{"field": "@initDuration", "value": "850.25"}] if index == 0 else []),
+                ],
+            })
+    return events
+
+
+class FakeLogsClient:
+    """
+    Serves the events in a query's log groups and time range, at most ingest.MAX_RESULTS of them
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.queries = {}
+        self._ids = itertools.count()
+
+    def start_query(self, logGroupNames, startTime, endTime, queryString, **_kwargs):
+        query_id = str(next(self._ids))
+        self.queries[query_id] = (logGroupNames, startTime, endTime)
+        return {"queryId": query_id}
+
+    def get_query_results(self, queryId):
+        log_group_names, start, end = self.queries[queryId]
+        rows = [event["row"] for event in self.events
+                if event["log_group"] in log_group_names and start <= event["timestamp"] <= end]
+        return {"status": "Complete", "results": rows[:ingest.MAX_RESULTS]}
+
+
+def run_ingest(logs_client, store, log_groups=LOG_GROUPS):
+    return ingest.ingest(logs_client, log_groups, START, START + datetime.timedelta(minutes=3), store,
+                         window=datetime.timedelta(minutes=1), start_query_rate=1000)
+
+
+@pytest.fixture
+def recordings(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_RESULTS", LIMIT)
+    fake = FakeLogsClient(make_events())
+    run_ingest(ingest.RecordingLogsClient(fake, str(tmp_path / "recordings")),
+               ingest.ParquetStore(str(tmp_path / "recorded")))
+    return fake, str(tmp_path / "recordings")
+
+
+def test_replay_bisects_windows_at_the_result_limit(recordings, tmp_path):
+    fake, directory = recordings
+    # The first minute hits the limit and is split; the other two windows are queried once each
+    assert len(fake.queries) > 3
+
+    store = ingest.ParquetStore(str(tmp_path / "replayed"))
+    summary = run_ingest(ingest.RecordedLogsClient(directory), store)
+    assert summary == {"windows_queried": 3, "windows_skipped": 0, "rows": 28}
+
+    records = store.load()
+    assert len(records) == 28
+    assert set(records["function_name"]) == {name.removeprefix("/aws/lambda/") for name in LOG_GROUPS}
+
+
+def test_second_run_skips_ingested_windows(recordings, tmp_path):
+    _, directory = recordings
+    store = ingest.ParquetStore(str(tmp_path / "replayed"))
+    run_ingest(ingest.RecordedLogsClient(directory), store)
+
+    assert run_ingest(ingest.RecordedLogsClient(directory), store) == {
+        "windows_queried": 0, "windows_skipped": 3, "rows": 0,
+    }
+    # A new log group makes each window pending again, for that log group only
+    summary = run_ingest(ingest.RecordedLogsClient(directory), store, [*LOG_GROUPS, "/aws/lambda/perf_new"])
+    assert summary["windows_queried"] == 3
+    assert len(store.load()) == 28
+
+
+def test_parse_results_types():
+    records = ingest.parse_results([event["row"] for event in make_events()[:2]])
+    assert list(records.columns) == list(ingest.REPORT_FIELDS.values())
+    assert isinstance(records["timestamp"].dtype, pd.DatetimeTZDtype)
+    assert records["timestamp"].iloc[1] == pd.Timestamp(START) + pd.Timedelta(seconds=5)
+    assert records["duration_ms"].tolist() == [12.5, 12.5]
+    assert records["memory_size_mb"].tolist() == [1024.0, 1024.0]
+    assert records["max_memory_used_mb"].tolist() == [256.0, 256.0]
+    assert records["init_duration_ms"].iloc[0] == 850.25
+    assert pd.isna(records["init_duration_ms"].iloc[1])
@@ -0,0 +1,34 @@
+import ast
+import os
+
+from lambda_datasci_perf.function import phases
+
+WORKLOADS_PATH = os.path.join(os.path.dirname(phases.__file__), "workloads.py")
+
+
+def recorded_spans() -> dict:
+    # Parsed rather than imported, so this runs without pandas and pyarrow
+    with open(WORKLOADS_PATH) as f:
+        tree = ast.parse(f.read())
+    spans = {}
+    for function in tree.body:
+        if not isinstance(function, ast.FunctionDef):
+            continue
+        for decorator in function.decorator_list:
+            if isinstance(decorator, ast.Call) and getattr(decorator.func, "id", None) == "workload":
+                spans[decorator.args[0].value] = {
+                    node.args[0].value for node in ast.walk(function)
+                    if isinstance(node, ast.Call) and getattr(node.func, "attr", None) == "span"
+                }
+    return spans
+
+
+def test_every_workload_span_is_declared():
+    assert recorded_spans() == {workload: set(names) for workload, names in phases.WORKLOAD_PHASES.items()}
+
+
+def test_phase_names_nest_workload_spans():
+    names = phases.phase_names()
+    assert "read_read_parquet" in names
+    assert "csv_to_parquet_encode_response" in names
+    assert len(names) == len(set(names))
@@ -0,0 +1,95 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(REPO_DIR, "lambda_datasci_perf", "function"))
+
+import streaming  # noqa: E402
+
+# scripts/local-bench.py is not importable by name, so its in-memory S3 client is loaded from the file
+_spec = importlib.util.spec_from_file_location("local_bench", os.path.join(REPO_DIR, "scripts", "local-bench.py"))
+local_bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(local_bench)
+
+BUCKET = "local-bench"
+
+
+class FailingCompleteS3Client(local_bench.LocalS3Client):
+    def __init__(self):
+        super().__init__()
+        self.aborted = []
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **_kwargs):
+        raise local_bench.LocalS3Error("InternalError")
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **_kwargs):
+        self.aborted.append(UploadId)
+        super().abort_multipart_upload(Bucket, Key, UploadId)
+
+
+def random_bytes(size: int) -> bytes:
+    return np.random.default_rng(0).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def test_multipart_upload_splits_into_parts():
+    client = local_bench.LocalS3Client()
+    data = random_bytes(2 * streaming.MIN_PART_SIZE + 1000)
+    writer = streaming.S3MultipartWriter(client, BUCKET, "multipart", part_size=streaming.MIN_PART_SIZE)
+    # Writes that straddle part boundaries
+    for start in range(0, len(data), 3_000_000):
+        writer.write(data[start:start + 3_000_000])
+    writer.close()
+
+    assert client.objects[(BUCKET, "multipart")] == data
+    assert [part["PartNumber"] for part in writer.parts] == [1, 2, 3]
+    assert writer.etag.endswith('-3"')
+    assert not client._uploads
+
+
+def test_small_object_uses_a_single_put():
+    client = local_bench.LocalS3Client()
+    writer = streaming.S3MultipartWriter(client, BUCKET, "small", part_size=streaming.MIN_PART_SIZE)
+    writer.write(b"parquet")
+    writer.close()
+
+    assert client.objects[(BUCKET, "small")] == b"parquet"
+    assert writer.parts == []
+    assert "-" not in writer.etag
+
+
+def test_failed_completion_aborts_the_upload():
+    client = FailingCompleteS3Client()
+    writer = streaming.S3MultipartWriter(client, BUCKET, "failed", part_size=streaming.MIN_PART_SIZE)
+    writer.write(random_bytes(streaming.MIN_PART_SIZE + 1))
+    with pytest.raises(local_bench.LocalS3Error):
+        writer.close()
+
+    assert client.aborted == ["1"]
+    assert not client._uploads
+    assert (BUCKET, "failed") not in client.objects
+    assert writer.closed
+
+
+def test_streamed_parquet_reads_back_with_ranged_gets():
+    client = local_bench.LocalS3Client()
+    # About 8 MB of Parquet, so the upload takes two parts
+    num_rows = 600_000
+    result = streaming.write_orders_streaming(client, BUCKET, "orders.parquet", num_rows,
+                                              rng=np.random.default_rng(0), chunk_rows=200_000,
+                                              part_size=streaming.MIN_PART_SIZE)
+    assert result["row_groups"] == 3
+    assert result["parts"] > 1
+    assert result["size"] == len(client.objects[(BUCKET, "orders.parquet")])
+
+    reader = streaming.S3RangeReader(client, BUCKET, "orders.parquet")
+    table = pq.read_table(reader, columns=["Order ID", "Unit Price"], filters=[("Order ID", "<=", 1000)])
+    assert table.num_rows == 1000
+    assert table.column_names == ["Order ID", "Unit Price"]
+    # Only the footer and the projected columns of the first row group are fetched
+    assert reader.bytes_read < result["size"] / 2
+    assert reader.requests > 0